@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from django.core.exceptions import ValidationError
+from django.db.models import Lookup
+from django.utils.six import string_types
+from django.utils.translation import ugettext_lazy as _
+
+from jsonfield import JSONField
+
+from .. import json_backend
+from ..conf import settings
+
+
+def is_native_json(connection):
+    """True if the blobs are stored in the native JSON type of `connection`."""
+    return bool(settings.MAPSTORE2_ADAPTER_NATIVE_JSON) and connection.vendor == 'postgresql'
+
+
+class BlobField(JSONField):
+    """
+    JSONField storing the MapStore blobs.
+
+    With MAPSTORE2_ADAPTER_NATIVE_JSON enabled, PostgreSQL stores them as
+    `jsonb`: the database parses and validates the JSON and it can be queried
+    server side. The other databases, SQLite included, keep the text column.
+    The column type is fixed by the migrations, see the setting.
+
+    Blobs are encoded and decoded by the MAPSTORE2_ADAPTER_JSON_BACKEND.
+    """
+
+    def pre_init(self, value, obj):
+        # As jsonfield, decodes the values loaded from the database only
+        _state = getattr(obj, '_state', None)
+        if isinstance(value, string_types) and _state is not None and _state.adding and \
+                getattr(obj, 'pk', None) is not None:
+            try:
+                return json_backend.loads(value)
+            except ValueError:
+                raise ValidationError(_("Enter valid JSON"))
+        return value
+
+    def get_prep_value(self, value):
+        if self.null and value is None:
+            return None
+        return json_backend.dumps(value, compact=True)
+
+    def db_type(self, connection):
+        if is_native_json(connection):
+            return 'jsonb'
+        return super(BlobField, self).db_type(connection)
+
+
+@BlobField.register_lookup
+class HasKey(Lookup):
+    """
+    Filters the blobs having `key`, e.g.
+    `MapStoreData.objects.filter(blob__has_key='widgetsConfig')`.
+
+    On PostgreSQL the key is matched at the top level of the blob only; the
+    text storage fallback matches it at any depth.
+    """
+    lookup_name = 'has_key'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        # Text storage fallback, matches the key as serialized by jsonfield
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        pattern = '%%%s%%' % connection.ops.prep_for_like_query('"%s":' % self.rhs)
+        return "%s %s" % (lhs, connection.operators['contains'] % '%s'), lhs_params + [pattern]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        # The cast is a no-op on jsonb columns and parses the text ones
+        return "(%s)::jsonb ? %%s" % lhs, lhs_params + [self.rhs]
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+import os
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+
+from ..conf import settings
+
+ID_SEQUENCE = "mapstore2_adapter_resource_id_seq"
+
+
+class SnowflakeIdGenerator(object):
+    """
+    Time ordered ids: milliseconds since EPOCH | worker | sequence.
+
+    The default layout fits 53 bits, so that the ids are still exact numbers
+    for the JavaScript clients, and allows 128 ids per millisecond per worker;
+    when they are exhausted the next millisecond is borrowed instead of
+    waiting for it.
+
+    Processes allocating ids at once, on the same host or not, must have
+    different worker ids, see MAPSTORE2_ADAPTER_ID_WORKER: nothing else tells
+    them apart, hence there is no default.
+    """
+    EPOCH = 1546300800000  # 2019-01-01T00:00:00Z
+    WORKER_BITS = 5
+    SEQUENCE_BITS = 7
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._pid = None
+        self._worker = 0
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    def get_worker_id(self):
+        worker_id = self.worker_id
+        if worker_id is None:
+            worker_id = settings.MAPSTORE2_ADAPTER_ID_WORKER
+        if worker_id is None:
+            raise ImproperlyConfigured(
+                "MAPSTORE2_ADAPTER_ID_WORKER must be set, to a different value for every "
+                "process allocating snowflake ids, or use the sequence_id allocator")
+        if not 0 <= worker_id < (1 << self.WORKER_BITS):
+            raise ImproperlyConfigured(
+                "MAPSTORE2_ADAPTER_ID_WORKER must be between 0 and %s" % ((1 << self.WORKER_BITS) - 1))
+        return worker_id
+
+    def __call__(self):
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # New process, e.g. a forked worker
+                self._pid = pid
+                self._worker = self.get_worker_id()
+                self._last_timestamp = -1
+                self._sequence = 0
+
+            # Never go back in time, even if the clock does
+            timestamp = max(int(time.time() * 1000), self._last_timestamp)
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    timestamp += 1
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+
+            elapsed = (timestamp - self.EPOCH) << (self.WORKER_BITS + self.SEQUENCE_BITS)
+            return elapsed | (self._worker << self.SEQUENCE_BITS) | self._sequence
+
+
+snowflake_id = SnowflakeIdGenerator()
+
+# Fallback of auto_id while no worker id is configured, fit for the single
+# process installs; see auto_id
+default_snowflake_id = SnowflakeIdGenerator(worker_id=0)
+
+
+def sequence_id():
+    """
+    Allocates the ids from a PostgreSQL sequence, created by the migrations:
+    never colliding whatever the number of processes.
+    """
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(%s)", [ID_SEQUENCE])
+        return cursor.fetchone()[0]
+
+
+def auto_id():
+    """
+    Allocates the ids with sequence_id on PostgreSQL, where the migrations
+    create the sequence, with snowflake_id on the other databases.
+
+    Without MAPSTORE2_ADAPTER_ID_WORKER the snowflake ids are allocated as
+    worker 0, so that stock installs work out of the box; processes sharing
+    a database other than PostgreSQL must set distinct worker ids.
+    """
+    from django.db import connection
+    if connection.vendor == 'postgresql':
+        return sequence_id()
+    if settings.MAPSTORE2_ADAPTER_ID_WORKER is None:
+        return default_snowflake_id()
+    return snowflake_id()
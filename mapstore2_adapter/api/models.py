@@ -16,22 +16,28 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_noop as _
 
-from jsonfield import JSONField
+from .fields import BlobField
+from ..conf import settings, load_path_attr
 
 log = logging.getLogger(__name__)
 
 
 def random_id():
+    # Kept for the migrations, use allocate_id
     return random.randint(1000, 99999)
 
 
+def allocate_id():
+    return load_path_attr(settings.MAPSTORE2_ADAPTER_ID_ALLOCATOR)()
+
+
 class MapStoreResource(models.Model):
     user = models.ForeignKey(get_user_model())
     id = models.BigIntegerField(
         primary_key=True,
         unique=True,
         editable=True,
-        default=random_id)
+        default=allocate_id)
     name = models.CharField(
         max_length=255,
         unique=False,
@@ -55,6 +61,9 @@ class MapStoreResource(models.Model):
         related_name="attributes",
         null=True,
         blank=True)
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False)
 
     class Meta:
         indexes = [
@@ -62,6 +71,15 @@ class MapStoreResource(models.Model):
             models.Index(fields=['name', ]),
         ]
 
+    def save(self, *args, **kwargs):
+        # The version of an existing resource is only changed by the compare
+        # and swap of MapStoreResourceViewSet.perform_update, never written
+        # back from a possibly stale instance
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [_f.name for _f in self._meta.concrete_fields
+                                       if not _f.primary_key and _f.name != 'version']
+        return super(MapStoreResource, self).save(*args, **kwargs)
+
 
 class MapStoreAttribute(models.Model):
     TYPE_STRING = 'string'
@@ -104,7 +122,7 @@ class MapStoreAttribute(models.Model):
 
 
 class MapStoreData(models.Model):
-    blob = JSONField(
+    blob = BlobField(
         null=False,
         default={})
     resource = models.ForeignKey(
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from rest_framework.pagination import CursorPagination
+
+from ..conf import settings
+
+
+class MapStoreResourcePagination(CursorPagination):
+    """
+    Cursor pagination of the MapStore resources, most recently updated first.
+
+    Pages are disabled unless MAPSTORE2_ADAPTER_REST_PAGE_SIZE is set or the
+    client asks for a `page_size`.
+    """
+    ordering = ('-last_update', '-id')
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        self.page_size = settings.MAPSTORE2_ADAPTER_REST_PAGE_SIZE
+        self.max_page_size = settings.MAPSTORE2_ADAPTER_REST_MAX_PAGE_SIZE
+        return super(MapStoreResourcePagination, self).get_page_size(request)
@@ -20,6 +20,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def get_requested_fields(request):
+    """
+    Returns the set of fields asked with the `fields` query parameter, e.g.
+    `?fields=id,name,last_update`, None if the parameter is missing.
+    """
+    _fields = request.query_params.get('fields') if request else None
+    if not _fields:
+        return None
+    return set(_f.strip() for _f in _fields.split(',') if _f.strip())
+
+
 class JSONSerializerField(serializers.Field):
     """ Serializer for JSONField -- required to make field writable"""
     id = serializers.ReadOnlyField()
@@ -77,6 +88,11 @@ class MapStoreResourceSerializer(serializers.HyperlinkedModelSerializer):
             self.fields['data'] = JSONSerializerField(read_only=False)
             self.fields['attributes'] = JSONArraySerializerField(read_only=False)
 
+        _fields = get_requested_fields(self.context['request'])
+        if _fields is not None:
+            for _f in set(self.fields) - _fields:
+                self.fields.pop(_f)
+
     class Meta:
         model = MapStoreResource
         fields = ('id', 'user', 'name', 'creation_date', 'last_update')
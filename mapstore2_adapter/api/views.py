@@ -10,20 +10,104 @@
 #########################################################################
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags
 
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.exceptions import APIException
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 
 from .models import MapStoreResource
+from .pagination import MapStoreResourcePagination
 from .serializers import (UserSerializer,
-                          MapStoreResourceSerializer,)
+                          MapStoreResourceSerializer,
+                          get_requested_fields,)
+from ..cache import invalidate_converted_config
 from ..hooks import hookset
 
+import calendar
+import hashlib
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+RESOURCE_STATE_FIELDS = ('id', 'last_update', 'version')
+
+# ETags of a single resource start with its version, see get_resources_etag
+ETAG_VERSION_RE = re.compile(r'^(?:W/)?"(\d+)-[0-9a-f]+"$')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has been modified since it was read.'
+    default_code = 'precondition_failed'
+
+
+def get_resources_etag(states, representation=''):
+    """
+    Returns a strong ETag of the resources `states`, a list of (id, last_update,
+    version) tuples, and of the `representation` they are serialized with.
+
+    The ETag of a single resource is prefixed by its version, so that it can
+    be matched by If-Match whatever the representation it was read with.
+    """
+    digest = hashlib.sha1()
+    for _id, _last_update, _version in states:
+        digest.update(('%s:%s:%s;' % (
+            _id, _last_update.isoformat() if _last_update else '', _version)).encode('utf8'))
+    digest.update(representation.encode('utf8'))
+    if len(states) == 1:
+        return '"%s-%s"' % (states[0][2], digest.hexdigest())
+    return '"%s"' % digest.hexdigest()
+
+
+def get_queryset_etag(queryset, representation=''):
+    """
+    Returns a strong ETag of the resources matched by `queryset` and of the
+    `representation` they are serialized with.
+
+    It is computed by the database from aggregates of their ids, versions
+    and updates, without loading every row, and changes as soon as a resource
+    is created, updated, deleted or made (in)visible by a permission change.
+    """
+    state = queryset.order_by().aggregate(
+        count=Count('id'), ids=Sum('id'), versions=Sum('version'), last_update=Max('last_update'))
+    digest = hashlib.sha1(('%s:%s:%s:%s;' % (
+        state['count'], state['ids'], state['versions'],
+        state['last_update'].isoformat() if state['last_update'] else '')).encode('utf8'))
+    digest.update(representation.encode('utf8'))
+    return '"%s"' % digest.hexdigest()
+
+
+def get_resources_last_modified(states):
+    """Returns the timestamp of the latest update among the resources `states`."""
+    _updates = [_state[1] for _state in states if _state[1]]
+    return calendar.timegm(max(_updates).utctimetuple()) if _updates else None
+
+
+def get_if_match_versions(request):
+    """
+    Returns the resource versions accepted by the If-Match header of `request`,
+    None if the header is missing or is `*`.
+    """
+    if_match = request.META.get('HTTP_IF_MATCH')
+    if not if_match:
+        return None
+    etags = parse_etags(if_match)
+    if '*' in etags:
+        return None
+    versions = []
+    for _etag in etags:
+        _match = ETAG_VERSION_RE.match(_etag)
+        if _match:
+            versions.append(int(_match.group(1)))
+    return versions
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """
@@ -42,23 +126,113 @@ class MapStoreResourceViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
     model = MapStoreResource
     serializer_class = MapStoreResourceSerializer
+    pagination_class = MapStoreResourcePagination
 
     def get_queryset(self):
         """ Return datasets belonging to the current user """
+        fields = get_requested_fields(self.request)
+
+        def requested(field):
+            return fields is None or field in fields
+
         queryset = self.model.objects.all()
+        if requested('user'):
+            queryset = queryset.select_related('user')
+        if self.request.query_params.get('full'):
+            # Blobs and attributes are serialized for every resource
+            if requested('data'):
+                queryset = queryset.select_related('data')
+            if requested('attributes'):
+                queryset = queryset.prefetch_related('attributes')
+        if fields is not None:
+            # Never load the columns the client did not ask for; 'last_update'
+            # is always needed by the pagination cursor
+            only = ['id', 'last_update']
+            only.extend(_f for _f in ('user', 'name', 'creation_date', 'data') if _f in fields)
+            queryset = queryset.only(*only)
 
         # filter to tasks owned by user making request
         queryset = hookset.get_queryset(self, queryset)
         return queryset
 
+    def get_conditional_response(self, request, etag, last_modified, view, *args, **kwargs):
+        """
+        Answers 304 Not Modified, without loading the resources, when the
+        client copy still matches the `etag` and `last_modified` validators;
+        otherwise returns the `view` response along with them.
+        """
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                if last_modified:
+                    response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """
+        Lists the resources, validated by an ETag only: the latest update does
+        not change when a resource is deleted or hidden, hence no Last-Modified.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = get_queryset_etag(queryset, request.META.get('QUERY_STRING', ''))
+
+        def view(request, *args, **kwargs):
+            # As ListModelMixin.list, on the queryset resolved above
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        return self.get_conditional_response(request, etag, None, view, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        states = list(queryset.values_list(*RESOURCE_STATE_FIELDS))
+        if not states:
+            return super(MapStoreResourceViewSet, self).retrieve(request, *args, **kwargs)
+        return self.get_conditional_response(
+            request,
+            get_resources_etag(states, request.META.get('QUERY_STRING', '')),
+            get_resources_last_modified(states),
+            super(MapStoreResourceViewSet, self).retrieve, *args, **kwargs)
+
     def perform_create(self, serializer):
         """ Associate current user as task owner """
         if serializer.is_valid():
             hookset.perform_create(self, serializer)
-            return serializer.save(user=self.request.user)
+            instance = serializer.save(user=self.request.user)
+            invalidate_converted_config(instance.id)
+            return instance
 
     def perform_update(self, serializer):
         """ Associate current user as task owner """
         if serializer.is_valid():
-            hookset.perform_update(self, serializer)
-            return serializer.save()
+            resource = serializer.instance
+            versions = get_if_match_versions(self.request)
+            if versions is None:
+                # Last writer wins, still the version read by get_object must
+                # not have changed meanwhile
+                versions = [resource.version]
+            with transaction.atomic():
+                hookset.perform_update(self, serializer)
+                instance = serializer.save()
+                # Compare and swap: last statement of the transaction, so that
+                # the row stays locked only from the save above to the commit;
+                # on a mismatch everything done so far is rolled back
+                updated = self.model.objects.filter(
+                    id=resource.id, version__in=versions).update(version=F('version') + 1)
+                if not updated:
+                    raise PreconditionFailed()
+            if len(versions) == 1:
+                instance.version = versions[0] + 1
+            else:
+                instance.version = self.model.objects.filter(
+                    id=instance.id).values_list('version', flat=True).get()
+            invalidate_converted_config(instance.id)
+            return instance
@@ -9,9 +9,23 @@
 #
 #########################################################################
 
+import importlib
+import logging
+import traceback
+
 from django.apps import AppConfig as BaseAppConfig
 from django.utils.translation import ugettext_lazy as _
 
+logger = logging.getLogger(__name__)
+
+# Modules the converter and the serializers import on the first request
+WARM_UP_MODULES = (
+    'mapstore2_adapter.plugins.geonode',
+    'mapstore2_adapter.plugins.serializers',
+    'geonode.maps.views',
+    'geonode.layers.views',
+)
+
 
 def run_setup_hooks(*args, **kwargs): 
     from geonode.urls import urlpatterns
@@ -22,6 +36,26 @@ def run_setup_hooks(*args, **kwargs):
     ]
 
 
+def run_warm_up(*args, **kwargs):
+    from .conf import settings
+    from .settings import validate_settings
+    from .utils import get_spatial_reference
+
+    validate_settings()
+
+    # The process-wide spatial references only: the transforms are built
+    # per thread, from them, by the threads serving the requests
+    for _srid in settings.MAPSTORE2_ADAPTER_WARM_UP_SRIDS:
+        get_spatial_reference(_srid)
+
+    for _module in WARM_UP_MODULES:
+        try:
+            importlib.import_module(_module)
+        except ImportError:
+            tb = traceback.format_exc()
+            logger.debug(tb)
+
+
 class AppConfig(BaseAppConfig):
 
     name = "mapstore2_adapter"
@@ -34,4 +68,8 @@ class AppConfig(BaseAppConfig):
             NO SIGNALS DEFINED YET
         """
         run_setup_hooks()
+
+        from .conf import settings
+        if settings.MAPSTORE2_ADAPTER_WARM_UP:
+            run_warm_up()
         super(AppConfig, self).ready()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+
+from django.core.cache import caches
+from django.utils.six import string_types, text_type
+
+from . import json_backend
+from .conf import settings
+
+
+CONVERTED_CONFIG_PREFIX = "mapstore2_adapter:config"
+
+
+def get_converted_config_cache():
+    """Returns the Django cache storing the converted configs, None if disabled."""
+    alias = settings.MAPSTORE2_ADAPTER_CONVERT_CACHE
+    return caches[alias] if alias else None
+
+
+def get_viewer_digest(viewer):
+    """Returns a digest of the viewer config, either as str or already parsed."""
+    if not isinstance(viewer, string_types):
+        viewer = json_backend.dumps(viewer, sort_keys=True)
+    if isinstance(viewer, text_type):
+        viewer = viewer.encode('utf8')
+    return hashlib.sha1(viewer).hexdigest()
+
+
+def get_permission_key(request):
+    """
+    Returns the tuple identifying the permissions the converted config has
+    been computed with. Object permissions changes are picked up once the
+    cached config expires.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return ('anonymous', )
+    return (user.pk, user.is_superuser, user.is_staff)
+
+
+def get_converted_config_key(viewer, request):
+    return "%s:%s:%s" % (
+        CONVERTED_CONFIG_PREFIX,
+        get_viewer_digest(viewer),
+        hashlib.sha1(repr(get_permission_key(request)).encode('utf8')).hexdigest())
+
+
+def _get_generation_key(map_id):
+    return "%s:generation:%s" % (CONVERTED_CONFIG_PREFIX, map_id)
+
+
+def get_resource_state(cache, map_id):
+    """
+    Returns the (last_update, generation) pair of the MapStoreResource
+    `map_id`, cached configs are valid only as long as it does not change.
+    """
+    if not map_id:
+        return (None, 0)
+    from .api.models import MapStoreResource
+    last_update = MapStoreResource.objects.filter(
+        id=map_id).values_list('last_update', flat=True).first()
+    return (last_update, cache.get(_get_generation_key(map_id), 0))
+
+
+def invalidate_converted_config(map_id):
+    """Drops the cached configs of the map `map_id`."""
+    cache = get_converted_config_cache()
+    if cache is None or not map_id:
+        return
+    key = _get_generation_key(map_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
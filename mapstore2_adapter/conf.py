@@ -43,6 +43,73 @@ class DjangoMapstore2AdapterAppConf(AppConf):
 
     SERIALIZER = "mapstore2_adapter.plugins.serializers.GeoStoreSerializer"
 
+    # Max number of GDAL spatial references kept in memory, shared by the
+    # per thread coordinate transforms
+    SRS_CACHE_SIZE = 64
+
+    # Alias of the Django cache storing the converted MapStore2 configs,
+    # None disables the cache
+    CONVERT_CACHE = None
+
+    # Seconds a converted config is kept in the cache
+    CONVERT_CACHE_TIMEOUT = 300
+
+    # Converted configs longer than this are not cached
+    CONVERT_CACHE_MAX_SIZE = 1024 * 1024
+
+    # Loads in AppConfig.ready() what the first requests would otherwise
+    # build: checks the baselayers and catalogue settings, builds the GDAL
+    # spatial references of WARM_UP_SRIDS and imports the GeoNode views
+    WARM_UP = False
+
+    # Native SRIDs of the layers, e.g. (32632, 2154); 4326 and 3857 are
+    # reprojected without GDAL and need no warm up
+    WARM_UP_SRIDS = ()
+
+    # Max number of converted overlays kept in memory, 0 disables the cache
+    OVERLAY_CACHE_SIZE = 1024
+
+    # Max number of featureInfo templates kept in memory
+    FEATURE_INFO_CACHE_SIZE = 256
+
+    # Callable resolving at once the ids of the resources the requesting user
+    # can view, see GeoNodeSerializer.get_queryset
+    ALLOWED_IDS_PROVIDER = "mapstore2_adapter.plugins.serializers.get_geonode_allowed_map_ids"
+
+    # Callable resolving at once the capabilities and sources of the layers
+    # of a saved map, see plugins.layers.get_layer_contexts
+    LAYER_CONTEXTS_PROVIDER = "mapstore2_adapter.plugins.layers.get_geonode_layer_contexts"
+
+    # Store the blobs in the native jsonb type on PostgreSQL. The column type
+    # is set when migration 0003 runs; to switch an already migrated database
+    # convert the column by hand, e.g. ALTER TABLE mapstore2_adapter_mapstoredata
+    # ALTER COLUMN blob TYPE jsonb USING blob::jsonb (or TYPE text back)
+    NATIVE_JSON = False
+
+    # Callable allocating the ids of the new resources, unless explicitly
+    # given by the client: "mapstore2_adapter.api.ids.sequence_id" (PostgreSQL
+    # only), "mapstore2_adapter.api.ids.snowflake_id" or
+    # "mapstore2_adapter.api.ids.auto_id", the former on PostgreSQL and the
+    # latter elsewhere
+    ID_ALLOCATOR = "mapstore2_adapter.api.ids.auto_id"
+
+    # Worker id, 0-31, of the process allocating snowflake ids: every process,
+    # on any host, must have its own. Required by snowflake_id, auto_id falls
+    # back to 0 without it
+    ID_WORKER = None
+
+    # JSON library used by the adapter: "json", "orjson", "ujson" or "auto",
+    # the fastest one installed; the fast ones encode the configs with
+    # compact separators and without escaping the non ASCII characters
+    JSON_BACKEND = "json"
+
+    # Default page size of the resources REST endpoint, None disables the
+    # pagination unless the client asks for a `page_size`
+    REST_PAGE_SIZE = None
+
+    # Max `page_size` a client can ask for
+    REST_MAX_PAGE_SIZE = 1000
+
     def configure_hookset(self, value):
         return load_path_attr(value)()
 
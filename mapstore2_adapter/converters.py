@@ -18,6 +18,8 @@ class BaseMapStore2ConfigConverter(object):
 
     def convert(self, viewer, request):
         """
+            viewer: str(config) or an already parsed config object
+
             return {
                 "version": 2,
                 "widgetsConfig": {
@@ -30,6 +32,12 @@ class BaseMapStore2ConfigConverter(object):
         """
         raise NotImplementedError()
 
+    def convert_stream(self, viewer, request):
+        """
+            Same as convert, returns an iterator over chunks of the config
+        """
+        return iter((self.convert(viewer, request), ))
+
     def get_overlays(self, viewer):
         """
             return (overlays, selected)
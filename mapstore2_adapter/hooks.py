@@ -9,22 +9,62 @@
 #
 #########################################################################
 
+import importlib
+import threading
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
 from .conf import settings
 from six import string_types
 
 
 class HookProxy(object):
+    """
+    Dispatches to the MAPSTORE2_ADAPTER_SERIALIZER hook.
+
+    The hook is instantiated once and shared by every thread, hence it must
+    not keep any per-request state; it is loaded again whenever the setting
+    changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._serializer = None
+        self._hook = None
+
+    def get_hook(self):
+        serializer = settings.MAPSTORE2_ADAPTER_SERIALIZER
+        hook = self._hook
+        if hook is None or self._serializer is not serializer:
+            with self._lock:
+                if self._hook is None or self._serializer is not serializer:
+                    self._hook = self.load_hook(serializer)
+                    self._serializer = serializer
+                hook = self._hook
+        return hook
+
+    def load_hook(self, serializer):
+        if not isinstance(serializer, string_types):
+            return serializer
+        cls = serializer.split(".")
+        module_name, class_name = (".".join(cls[:-1]), cls[-1])
+        i = importlib.import_module(module_name)
+        return getattr(i, class_name)()
+
+    def clear(self):
+        with self._lock:
+            self._serializer = None
+            self._hook = None
 
     def __getattr__(self, attr):
-        if not isinstance(settings.MAPSTORE2_ADAPTER_SERIALIZER, string_types):
-            return getattr(settings.MAPSTORE2_ADAPTER_SERIALIZER, attr)
-        else:
-            import importlib
-            cls = settings.MAPSTORE2_ADAPTER_SERIALIZER.split(".")
-            module_name, class_name = (".".join(cls[:-1]), cls[-1])
-            i = importlib.import_module(module_name)
-            hook = getattr(i, class_name)()
-            return getattr(hook, attr)
+        return getattr(self.get_hook(), attr)
 
 
 hookset = HookProxy()
+
+
+@receiver(setting_changed)
+def clear_hookset(setting, **kwargs):
+    if setting == "MAPSTORE2_ADAPTER_SERIALIZER":
+        hookset.clear()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+"""
+JSON encoding and decoding of the adapter, backed by the standard library
+unless MAPSTORE2_ADAPTER_JSON_BACKEND opts into orjson or ujson.
+
+Every backend encodes the DjangoJSONEncoder types the same way and sorts
+the keys on demand; only the whitespace, the escaping of non ASCII
+characters and the notation of large floats may differ among them, hence
+the output of the adapter changes only when a fast backend is chosen.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import importlib
+import json
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .conf import settings
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def get_json_encoder():
+    "Returns DjangoJSONEncoder, imported on first use."
+    from django.core.serializers.json import DjangoJSONEncoder
+    return DjangoJSONEncoder
+
+
+class StdlibBackend(object):
+    name = 'json'
+    # Separators and escaping of dumps, see utils.iter_json
+    separators = None
+    ensure_ascii = True
+
+    def loads(self, s):
+        return json.loads(s)
+
+    def dumps(self, obj, sort_keys=False, compact=False):
+        return json.dumps(obj, cls=get_json_encoder(), sort_keys=sort_keys,
+                          separators=COMPACT_SEPARATORS if compact else None)
+
+
+class OrjsonBackend(object):
+    name = 'orjson'
+    separators = COMPACT_SEPARATORS
+    ensure_ascii = False
+
+    def __init__(self, orjson):
+        self.orjson = orjson
+        self.default = get_json_encoder()().default
+        # datetimes go through DjangoJSONEncoder, which truncates them to
+        # milliseconds
+        self.options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def loads(self, s):
+        return self.orjson.loads(s)
+
+    def dumps(self, obj, sort_keys=False, compact=False):
+        options = self.options | (self.orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return self.orjson.dumps(obj, default=self.default, option=options).decode('utf8')
+
+
+class UjsonBackend(StdlibBackend):
+    """
+    Decodes with ujson; encodes with the standard library, since ujson
+    encodes Decimals as numbers and has no hook for the other Django types.
+    """
+    name = 'ujson'
+
+    def __init__(self, ujson):
+        self.ujson = ujson
+
+    def loads(self, s):
+        return self.ujson.loads(s)
+
+
+BACKENDS = (
+    ('orjson', OrjsonBackend),
+    ('ujson', UjsonBackend),
+)
+
+_backends = {}
+
+
+def _load_backend(name):
+    if name == StdlibBackend.name:
+        return StdlibBackend()
+    for _name, _backend in BACKENDS:
+        if name in (_name, 'auto'):
+            try:
+                return _backend(importlib.import_module(_name))
+            except ImportError:
+                if name == _name:
+                    raise ImproperlyConfigured(
+                        "MAPSTORE2_ADAPTER_JSON_BACKEND '{0}' is not installed".format(name))
+    if name == 'auto':
+        return StdlibBackend()
+    raise ImproperlyConfigured("Unknown MAPSTORE2_ADAPTER_JSON_BACKEND '{0}'".format(name))
+
+
+def get_backend():
+    """Returns the JSON backend selected by MAPSTORE2_ADAPTER_JSON_BACKEND."""
+    name = settings.MAPSTORE2_ADAPTER_JSON_BACKEND or StdlibBackend.name
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = _load_backend(name)
+    return backend
+
+
+def loads(s):
+    return get_backend().loads(s)
+
+
+def dumps(obj, sort_keys=False, compact=False):
+    """
+    Encodes `obj`, DjangoJSONEncoder types included, as a str; `compact`
+    drops the whitespace after the separators where the backend adds it.
+    """
+    return get_backend().dumps(obj, sort_keys=sort_keys, compact=compact)
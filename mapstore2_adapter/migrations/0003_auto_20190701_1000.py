@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import mapstore2_adapter.api.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mapstore2_adapter', '0002_auto_20190618_1236'),
+    ]
+
+    operations = [
+        # Converts the blob column to jsonb, in place, when MAPSTORE2_ADAPTER_NATIVE_JSON
+        # is enabled on PostgreSQL while this migration runs; a no-op otherwise
+        migrations.AlterField(
+            model_name='mapstoredata',
+            name='blob',
+            field=mapstore2_adapter.api.fields.BlobField(default={}),
+        ),
+    ]
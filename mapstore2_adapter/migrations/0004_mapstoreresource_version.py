@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mapstore2_adapter', '0003_auto_20190701_1000'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mapstoreresource',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import mapstore2_adapter.api.models
+
+from mapstore2_adapter.api.ids import ID_SEQUENCE
+
+
+def create_id_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    MapStoreResource = apps.get_model('mapstore2_adapter', 'MapStoreResource')
+    last_id = MapStoreResource.objects.aggregate(last_id=models.Max('id'))['last_id'] or 0
+    schema_editor.execute(
+        "CREATE SEQUENCE IF NOT EXISTS %s START WITH %d" % (ID_SEQUENCE, last_id + 1))
+
+
+def drop_id_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP SEQUENCE IF EXISTS %s" % ID_SEQUENCE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mapstore2_adapter', '0004_mapstoreresource_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mapstoreresource',
+            name='id',
+            field=models.BigIntegerField(default=mapstore2_adapter.api.models.allocate_id, primary_key=True, serialize=False, unique=True),
+        ),
+        migrations.RunPython(create_id_sequence, drop_id_sequence),
+    ]
@@ -11,50 +11,167 @@
 
 from __future__ import absolute_import, unicode_literals
 
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
-
+import copy
+import hashlib
 import logging
 import traceback
 
 from ..utils import (GoogleZoom,
+                     get_numpy,
                      get_wfs_endpoint,
                      get_valid_number,
+                     iter_json,
+                     LRUCache,
+                     reproject_bbox,
+                     reproject_bboxes,
                      to_json)
 from ..settings import (MAP_BASELAYERS,
+                        MAP_BASELAYERS_INDEX,
+                        get_baselayers_index,
                         CATALOGUE_SERVICES,
                         CATALOGUE_SELECTED_SERVICE
                         )
 
+from ..cache import (get_converted_config_cache,
+                     get_converted_config_key,
+                     get_resource_state)
 from ..converters import BaseMapStore2ConfigConverter
+from .permissions import get_permission_resolver
 
-from django.contrib.gis.geos import Polygon
-from django.contrib.gis.gdal import SpatialReference, CoordTransform
-from django.core.serializers.json import DjangoJSONEncoder
-from django.conf import settings
+from .. import json_backend
+from ..conf import settings
 
 
 logger = logging.getLogger(__name__)
 
+# Converted overlays, see GeoNodeMapStore2ConfigConverter.get_overlay
+overlay_cache = LRUCache(maxsize=settings.MAPSTORE2_ADAPTER_OVERLAY_CACHE_SIZE)
+
+# featureInfo templates, see get_feature_info_template
+feature_info_cache = LRUCache(maxsize=settings.MAPSTORE2_ADAPTER_FEATURE_INFO_CACHE_SIZE)
+
+FEATURE_INFO_ROW = (
+    '<div class="row">'
+    '<div class="col-xs-4" style="font-weight: bold; word-wrap: break-word;">%s</div>'
+    '                                         '
+    '<div class="col-xs-8" style="word-wrap: break-word;">${properties.%s}</div>'
+    '</div>')
+
+
+def get_feature_info_template(fields, propertyNames):
+    """
+        Returns the HTML featureInfo template of the layer `fields`, labelled
+        by `propertyNames`; templates are cached by (field, label) pairs.
+    """
+    _rows = tuple((_field, propertyNames[_field] if propertyNames[_field] else _field) for _field in fields)
+
+    def build():
+        return '<div>%s</div>' % ''.join(FEATURE_INFO_ROW % (_label, _field) for _field, _label in _rows)
+
+    try:
+        return feature_info_cache.get_or_create(_rows, build)
+    except TypeError:
+        # Unhashable fields or labels
+        return build()
+
+
+# Marks the fields copied only if present
+MISSING = object()
+
 
 class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
 
+    # GXP layer -> MapStore2 overlay mapping of convert_overlay, as
+    # (source key, target key, default, transform) entries; MISSING fields are
+    # copied only if present. Projects can extend it for their own layer keys.
+    OVERLAY_FIELDS = (
+        ('visibility', 'visibility', True, None),
+        ('singleTile', 'singleTile', False, None),
+        ('selected', 'selected', False, None),
+        ('hidden', 'hidden', False, None),
+        ('handleClickOnLayer', 'handleClickOnLayer', False, None),
+        ('wrapDateLine', 'wrapDateLine', False, None),
+        ('hideLoading', 'hideLoading', False, None),
+        ('useForElevation', 'useForElevation', False, None),
+        ('fixed', 'fixed', False, None),
+        ('opacity', 'opacity', 1.0, None),
+        ('title', 'title', '', None),
+        ('name', 'name', '', None),
+        ('group', 'group', '', None),
+        ('format', 'format', "image/png", None),
+        ('dimensions', 'dimensions', MISSING, None),
+        ('search', 'search', MISSING, None),
+        ('style', 'style', MISSING, None),
+    )
+
+    # Same as OVERLAY_FIELDS, for the entries of the layer 'capability'
+    CAPABILITY_FIELDS = (
+        ('styles', 'styles', MISSING, None),
+        ('style', 'style', MISSING, None),
+        ('abstract', 'abstract', MISSING, None),
+        ('attribution', 'attribution', MISSING, None),
+        ('keywords', 'keywords', MISSING, None),
+        ('llbbox', 'llbbox', MISSING, None),
+    )
+
     def convert(self, viewer, request):
         """
-            input: GeoNode JSON Gxp Config
+            input: GeoNode JSON Gxp Config, either as str or already parsed
             output: MapStore2 compliant str(config)
+
+            When MAPSTORE2_ADAPTER_CONVERT_CACHE is set, the converted config
+            is cached until the viewer, the user or the MapStoreResource of
+            the map change.
         """
-        # Initialization
-        viewer_obj = json.loads(viewer)
+        cache = get_converted_config_cache()
+        if cache is None:
+            return json_backend.dumps(self.get_config(viewer, request), sort_keys=True)
+
+        key = get_converted_config_key(viewer, request)
+        cached = cache.get(key)
+        if cached is not None:
+            map_id, state, config = cached
+            if get_resource_state(cache, map_id) == state:
+                return config
+
+        viewer_obj = to_json(viewer)
+        map_id = self.get_map_id(viewer_obj)
+        state = get_resource_state(cache, map_id)
+        config = json_backend.dumps(self.get_config(viewer_obj, request), sort_keys=True)
+        if len(config) <= settings.MAPSTORE2_ADAPTER_CONVERT_CACHE_MAX_SIZE:
+            cache.set(key, (map_id, state, config), settings.MAPSTORE2_ADAPTER_CONVERT_CACHE_TIMEOUT)
+        return config
+
+    def convert_stream(self, viewer, request):
+        """
+            Same as convert, yielding chunks of the config instead of building
+            the whole string: the config can be sent by a StreamingHttpResponse.
+        """
+        if get_converted_config_cache() is not None:
+            # The cached configs are stored as strings anyway
+            return iter((self.convert(viewer, request), ))
+        return iter_json(self.get_config(viewer, request))
 
+    def get_map_id(self, viewer_obj):
         map_id = None
         if 'id' in viewer_obj and viewer_obj['id']:
             try:
                 map_id = int(viewer_obj['id'])
             except BaseException:
                 pass
+        return map_id
+
+    def get_config(self, viewer, request):
+        """
+            input: GeoNode JSON Gxp Config, either as str or already parsed
+            output: MapStore2 compliant config, not serialized
+
+            The viewer is parsed only once here and the resulting object is
+            handed over to every following stage.
+        """
+        # Initialization
+        viewer_obj = to_json(viewer)
+        map_id = self.get_map_id(viewer_obj)
 
         data = {}
         data['version'] = 2
@@ -70,7 +187,7 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
             ms2_map['maxResolution'] = viewer_obj['map']['maxResolution']
 
             # Backgrouns
-            backgrounds = self.getBackgrounds(viewer, MAP_BASELAYERS)
+            backgrounds = self.getBackgrounds(viewer_obj, MAP_BASELAYERS)
             if backgrounds:
                 ms2_map['layers'] = backgrounds
             else:
@@ -108,32 +225,20 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
             ms2_map['info'] = info
 
             # Overlays
-            overlays, selected = self.get_overlays(viewer, request=request)
+            overlays, selected = self.get_overlays(viewer_obj, request=request)
+            self.set_overlays_center_and_zoom(viewer_obj['map'], overlays)
             if selected and 'name' in selected and selected['name'] and not map_id:
                 # We are generating a Layer Details View
-                center, zoom = self.get_center_and_zoom(viewer_obj['map'], selected)
+                if 'zoom' in selected:
+                    center, zoom = selected['center'], selected['zoom']
+                else:
+                    center, zoom = self.get_center_and_zoom(viewer_obj['map'], selected)
                 ms2_map['center'] = center
                 ms2_map['zoom'] = zoom
 
-                try:
-                    # - extract from GeoNode guardian
-                    from geonode.layers.views import (_resolve_layer,
-                                                      _PERMISSION_MSG_MODIFY,
-                                                      _PERMISSION_MSG_DELETE)
-                    if _resolve_layer(request,
-                                      selected['name'],
-                                      'base.change_resourcebase',
-                                      _PERMISSION_MSG_MODIFY):
-                        info['canEdit'] = True
-
-                    if _resolve_layer(request,
-                                      selected['name'],
-                                      'base.delete_resourcebase',
-                                      _PERMISSION_MSG_DELETE):
-                        info['canDelete'] = True
-                except BaseException:
-                    tb = traceback.format_exc()
-                    logger.debug(tb)
+                # - extract from GeoNode guardian
+                self.set_permissions_info(
+                    info, get_permission_resolver(request).get_layer_perms(selected['name']))
             else:
                 # We are getting the configuration of a Map
                 # On GeoNode model the Map Center is always saved in 4326
@@ -143,25 +248,9 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
                     'crs': 'EPSG:4326'
                 }
 
-                try:
-                    # - extract from GeoNode guardian
-                    from geonode.maps.views import (_resolve_map,
-                                                    _PERMISSION_MSG_SAVE,
-                                                    _PERMISSION_MSG_DELETE)
-                    if _resolve_map(request,
-                                    str(map_id),
-                                    'base.change_resourcebase',
-                                    _PERMISSION_MSG_SAVE):
-                        info['canEdit'] = True
-
-                    if _resolve_map(request,
-                                    str(map_id),
-                                    'base.delete_resourcebase',
-                                    _PERMISSION_MSG_DELETE):
-                        info['canDelete'] = True
-                except BaseException:
-                    tb = traceback.format_exc()
-                    logger.debug(tb)
+                # - extract from GeoNode guardian
+                self.set_permissions_info(
+                    info, get_permission_resolver(request).get_map_perms(map_id))
 
             for overlay in overlays:
                 if 'name' in overlay and overlay['name']:
@@ -197,155 +286,59 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
                 # traceback.print_exc()
                 tb = traceback.format_exc()
                 logger.debug(tb)
-        return json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+        return data
+
+    def set_permissions_info(self, info, perms):
+        """
+            Flags in `info` the actions allowed by the `perms` of a
+            PermissionResolver, leaving the others untouched
+        """
+        if perms.get('change_resourcebase'):
+            info['canEdit'] = True
+        if perms.get('delete_resourcebase'):
+            info['canDelete'] = True
 
     def getBackgrounds(self, viewer, defaults):
-        import copy
-        backgrounds = copy.copy(defaults)
-        for bg in backgrounds:
-            bg['visibility'] = False
+        """
+            input: GeoNode JSON Gxp Config, either as str or already parsed
+
+            Returns copies of the `defaults` backgrounds, the templates shared
+            by the requests are never modified.
+        """
+        backgrounds = [dict(bg, visibility=False) for bg in defaults]
+        index = MAP_BASELAYERS_INDEX if defaults is MAP_BASELAYERS else get_baselayers_index(defaults)
         try:
-            viewer_obj = json.loads(viewer)
+            viewer_obj = to_json(viewer)
             layers = viewer_obj['map']['layers']
-            # sources = viewer_obj['sources']
             for layer in layers:
                 if 'group' in layer and layer['group'] == "background":
-                    # source = sources[layer['source']]
-                    def_background = [bg for bg in backgrounds if bg['name'] == layer['name']]
-                    background = def_background[0] if def_background else None
-                    if background:
+                    _i = index.get(layer.get('name'))
+                    if _i is not None:
+                        background = backgrounds[_i]
                         background['opacity'] = layer['opacity'] if 'opacity' in layer else 1.0
                         background['visibility'] = layer['visibility'] if 'visibility' in layer else False
         except BaseException:
-            backgrounds = copy.copy(defaults)
+            backgrounds = [dict(bg, visibility=False) for bg in defaults]
             tb = traceback.format_exc()
             logger.debug(tb)
         return backgrounds
 
     def get_overlays(self, viewer, request=None):
+        """
+            input: GeoNode JSON Gxp Config, either as str or already parsed
+        """
         overlays = []
         selected = None
         try:
-            viewer_obj = json.loads(viewer)
+            viewer_obj = to_json(viewer)
             layers = viewer_obj['map']['layers']
             sources = viewer_obj['sources']
+            projection = viewer_obj['map']['projection']
 
             for layer in layers:
                 if 'group' not in layer or layer['group'] != "background":
                     source = sources[layer['source']]
-                    overlay = {}
-                    if 'url' in source:
-                        overlay['type'] = "wms" if 'ptype' not in source or \
-                            source['ptype'] != 'gxp_arcrestsource' else 'arcgis'
-                        overlay['url'] = source['url']
-                        overlay['visibility'] = layer['visibility'] if 'visibility' in layer else True
-                        overlay['singleTile'] = layer['singleTile'] if 'singleTile' in layer else False
-                        overlay['selected'] = layer['selected'] if 'selected' in layer else False
-                        overlay['hidden'] = layer['hidden'] if 'hidden' in layer else False
-                        overlay['handleClickOnLayer'] = layer['handleClickOnLayer'] if \
-                            'handleClickOnLayer' in layer else False
-                        overlay['wrapDateLine'] = layer['wrapDateLine'] if 'wrapDateLine' in layer else False
-                        overlay['hideLoading'] = layer['hideLoading'] if 'hideLoading' in layer else False
-                        overlay['useForElevation'] = layer['useForElevation'] if 'useForElevation' in layer else False
-                        overlay['fixed'] = layer['fixed'] if 'fixed' in layer else False
-                        overlay['opacity'] = layer['opacity'] if 'opacity' in layer else 1.0
-                        overlay['title'] = layer['title'] if 'title' in layer else ''
-                        overlay['name'] = layer['name'] if 'name' in layer else ''
-                        overlay['group'] = layer['group'] if 'group' in layer else ''
-                        overlay['format'] = layer['format'] if 'format' in layer else "image/png"
-                        overlay['bbox'] = {}
-
-                        if 'dimensions' in layer:
-                            overlay['dimensions'] = layer['dimensions']
-
-                        if 'search' in layer:
-                            overlay['search'] = layer['search']
-
-                        if 'style' in layer:
-                            overlay['style'] = layer['style']
-
-                        if 'capability' in layer:
-                            capa = layer['capability']
-                            if 'styles' in capa:
-                                overlay['styles'] = capa['styles']
-                            if 'style' in capa:
-                                overlay['style'] = capa['style']
-                            if 'abstract' in capa:
-                                overlay['abstract'] = capa['abstract']
-                            if 'attribution' in capa:
-                                overlay['attribution'] = capa['attribution']
-                            if 'keywords' in capa:
-                                overlay['keywords'] = capa['keywords']
-                            if 'dimensions' in capa and capa['dimensions']:
-                                overlay['dimensions'] = self.get_layer_dimensions(dimensions=capa['dimensions'])
-                            if 'llbbox' in capa:
-                                overlay['llbbox'] = capa['llbbox']
-                            if 'storeType' in capa and capa['storeType'] == 'dataStore':
-                                overlay['search'] = {
-                                    "url": get_wfs_endpoint(request),
-                                    "type": "wfs"
-                                }
-                            if 'bbox' in capa:
-                                bbox = capa['bbox']
-                                if viewer_obj['map']['projection'] in bbox:
-                                    proj = viewer_obj['map']['projection']
-                                    bbox = capa['bbox'][proj]
-                                    overlay['bbox']['bounds'] = {
-                                        "minx": get_valid_number(bbox['bbox'][0]),
-                                        "miny": get_valid_number(bbox['bbox'][1]),
-                                        "maxx": get_valid_number(bbox['bbox'][2]),
-                                        "maxy": get_valid_number(bbox['bbox'][3])
-                                    }
-                                    overlay['bbox']['crs'] = bbox['srs']
-
-                        if 'bbox' in layer and not overlay['bbox']:
-                            if 'bounds' in layer['bbox']:
-                                overlay['bbox'] = layer['bbox']
-                            else:
-                                overlay['bbox']['bounds'] = {
-                                    "minx": get_valid_number(layer['bbox'][0],
-                                                             default=layer['bbox'][2],
-                                                             complementar=True),
-                                    "miny": get_valid_number(layer['bbox'][1],
-                                                             default=layer['bbox'][3],
-                                                             complementar=True),
-                                    "maxx": get_valid_number(layer['bbox'][2],
-                                                             default=layer['bbox'][0],
-                                                             complementar=True),
-                                    "maxy": get_valid_number(layer['bbox'][3],
-                                                             default=layer['bbox'][1],
-                                                             complementar=True)
-                                }
-                                overlay['bbox']['crs'] = layer['srs'] if 'srs' in layer else \
-                                    viewer_obj['map']['projection']
-
-                        if 'getFeatureInfo' in layer and layer['getFeatureInfo']:
-                            if 'fields' in layer['getFeatureInfo'] and layer['getFeatureInfo']['fields'] and \
-                                    'propertyNames' in layer['getFeatureInfo'] and \
-                                    layer['getFeatureInfo']['propertyNames']:
-                                fields = layer['getFeatureInfo']['fields']
-                                propertyNames = layer['getFeatureInfo']['propertyNames']
-                                featureInfo = {'format': 'TEMPLATE'}
-
-                                _template = '<div>'
-                                for _field in fields:
-                                    _template += '<div class="row">'
-                                    _template += '<div class="col-xs-4" style="font-weight: bold; word-wrap: break-word;">%s</div> \
-                                        <div class="col-xs-8" style="word-wrap: break-word;">${properties.%s}</div>' % \
-                                        (propertyNames[_field] if propertyNames[_field] else _field, _field)
-                                    _template += '</div>'
-                                _template += '</div>'
-
-                                featureInfo['template'] = _template
-                                overlay['featureInfo'] = featureInfo
-
-                            # Push extraParams into GeoNode layerParams
-                            if 'extraParams' in layer and layer['extraParams']:
-                                overlay['extraParams'] = layer['extraParams']
-
-                    # Restore the id of ms2 layer
-                    if "extraParams" in layer and "msId" in layer["extraParams"]:
-                        overlay["id"] = layer["extraParams"]["msId"]
+                    overlay = self.get_overlay(layer, source, projection, request=request)
                     overlays.append(overlay)
                     if not selected or ('selected' in layer and layer['selected']):
                         selected = overlay
@@ -355,6 +348,131 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
 
         return (overlays, selected)
 
+    def get_overlay(self, layer, source, projection, request=None):
+        """
+            Returns the overlay of the GXP `layer`, as from convert_overlay.
+
+            The entries converted from the layer capability are computed once
+            per process for every capability content and projection, up to
+            MAPSTORE2_ADAPTER_OVERLAY_CACHE_SIZE of them, and deep copied into
+            the overlay; the layer entries are mapped on every call.
+        """
+        capa = layer.get('capability')
+        if not overlay_cache.maxsize or 'url' not in source or not isinstance(capa, dict):
+            return self.convert_overlay(layer, source, projection, request=request)
+
+        wfs_url = get_wfs_endpoint(request) if capa.get('storeType') == 'dataStore' else None
+        digest = hashlib.sha1(json_backend.dumps(capa, sort_keys=True).encode('utf8')).hexdigest()
+        key = (self.__class__, digest, projection, wfs_url, getattr(settings, "GEOSERVER_PUBLIC_LOCATION", ""))
+        converted = overlay_cache.get_or_create(
+            key, lambda: self.convert_capability(capa, projection, request=request))
+        return self.build_overlay(layer, source, projection, copy.deepcopy(converted))
+
+    def convert_overlay(self, layer, source, projection, request=None):
+        """
+            input: GXP layer, its source and the map projection
+            output: MapStore2 overlay
+        """
+        converted = None
+        if 'url' in source and 'capability' in layer:
+            converted = self.convert_capability(layer['capability'], projection, request=request)
+        return self.build_overlay(layer, source, projection, converted)
+
+    def convert_capability(self, capa, projection, request=None):
+        """
+            Returns the overlay entries converted from the GXP layer
+            capability `capa`, overriding the ones of the layer itself
+        """
+        converted = {}
+        self.map_fields(capa, converted, self.CAPABILITY_FIELDS)
+        if 'dimensions' in capa and capa['dimensions']:
+            converted['dimensions'] = self.get_layer_dimensions(dimensions=capa['dimensions'])
+        if 'storeType' in capa and capa['storeType'] == 'dataStore':
+            converted['search'] = {
+                "url": get_wfs_endpoint(request),
+                "type": "wfs"
+            }
+        if 'bbox' in capa:
+            bbox = capa['bbox']
+            if projection in bbox:
+                bbox = capa['bbox'][projection]
+                converted['bbox'] = {
+                    "bounds": {
+                        "minx": get_valid_number(bbox['bbox'][0]),
+                        "miny": get_valid_number(bbox['bbox'][1]),
+                        "maxx": get_valid_number(bbox['bbox'][2]),
+                        "maxy": get_valid_number(bbox['bbox'][3])
+                    },
+                    "crs": bbox['srs']
+                }
+        return converted
+
+    def build_overlay(self, layer, source, projection, converted=None):
+        """
+            Returns the overlay of the GXP `layer`, updated with the entries
+            `converted` from its capability, if any
+        """
+        overlay = {}
+        if 'url' in source:
+            overlay['type'] = "wms" if 'ptype' not in source or \
+                source['ptype'] != 'gxp_arcrestsource' else 'arcgis'
+            overlay['url'] = source['url']
+            self.map_fields(layer, overlay, self.OVERLAY_FIELDS)
+            overlay['bbox'] = {}
+            if converted:
+                overlay.update(converted)
+
+            if 'bbox' in layer and not overlay['bbox']:
+                if 'bounds' in layer['bbox']:
+                    overlay['bbox'] = layer['bbox']
+                else:
+                    overlay['bbox']['bounds'] = {
+                        "minx": get_valid_number(layer['bbox'][0],
+                                                 default=layer['bbox'][2],
+                                                 complementar=True),
+                        "miny": get_valid_number(layer['bbox'][1],
+                                                 default=layer['bbox'][3],
+                                                 complementar=True),
+                        "maxx": get_valid_number(layer['bbox'][2],
+                                                 default=layer['bbox'][0],
+                                                 complementar=True),
+                        "maxy": get_valid_number(layer['bbox'][3],
+                                                 default=layer['bbox'][1],
+                                                 complementar=True)
+                    }
+                    overlay['bbox']['crs'] = layer['srs'] if 'srs' in layer else \
+                        projection
+
+            if 'getFeatureInfo' in layer and layer['getFeatureInfo']:
+                if 'fields' in layer['getFeatureInfo'] and layer['getFeatureInfo']['fields'] and \
+                        'propertyNames' in layer['getFeatureInfo'] and \
+                        layer['getFeatureInfo']['propertyNames']:
+                    fields = layer['getFeatureInfo']['fields']
+                    propertyNames = layer['getFeatureInfo']['propertyNames']
+                    featureInfo = {'format': 'TEMPLATE'}
+                    featureInfo['template'] = get_feature_info_template(fields, propertyNames)
+                    overlay['featureInfo'] = featureInfo
+
+                # Push extraParams into GeoNode layerParams
+                if 'extraParams' in layer and layer['extraParams']:
+                    overlay['extraParams'] = layer['extraParams']
+
+        # Restore the id of ms2 layer
+        if "extraParams" in layer and "msId" in layer["extraParams"]:
+            overlay["id"] = layer["extraParams"]["msId"]
+        return overlay
+
+    def map_fields(self, source, target, fields):
+        """
+            Copies into `target` the `source` entries listed in `fields`, a
+            table of (source key, target key, default, transform) entries
+        """
+        _get = source.get
+        for _source_key, _target_key, _default, _transform in fields:
+            value = _get(_source_key, _default)
+            if value is not MISSING:
+                target[_target_key] = _transform(value) if _transform else value
+
     def get_layer_dimensions(self, dimensions):
         url = getattr(settings, "GEOSERVER_PUBLIC_LOCATION", "")
         if url.endswith('ows'):
@@ -396,28 +514,73 @@ class GeoNodeMapStore2ConfigConverter(BaseMapStore2ConfigConverter):
         else:
             return (center, zoom)
 
+    def get_centers_and_zooms(self, view_map, bboxes, crs):
+        """
+            input: (N, 4) array of [minx, miny, maxx, maxy] bboxes and the
+                   N matching crs codes
+            output: list of N (center, zoom) pairs, as from get_center_and_zoom
+
+            When NumPy is available all the bboxes are reprojected and zoomed
+            at once with vectorized math, otherwise one at a time.
+        """
+        numpy = get_numpy()
+        if numpy is None:
+            return [self.get_center_and_zoom(view_map, {
+                'bbox': {
+                    'bounds': dict(zip(('minx', 'miny', 'maxx', 'maxy'), bbox)),
+                    'crs': ov_crs
+                }}) for bbox, ov_crs in zip(bboxes, crs)]
+
+        bboxes = numpy.asarray(bboxes, dtype=float).reshape(-1, 4)
+        centers = bboxes[:, :2] + (bboxes[:, 2:] - bboxes[:, :2]) / 2.
+        extents = reproject_bboxes(bboxes, crs, 4326)
+        projected = ~numpy.isnan(extents).any(axis=1)
+        zooms = numpy.full(len(bboxes), -1, dtype=int)
+        if projected.any():
+            zooms[projected] = GoogleZoom().get_extents_zoom(extents[projected])
+
+        centers_and_zooms = []
+        for i, ov_crs in enumerate(crs):
+            center = {
+                "x": get_valid_number(centers[i, 0]),
+                "y": get_valid_number(centers[i, 1]),
+                "crs": ov_crs
+            }
+            if not projected[i]:
+                centers_and_zooms.append((center, view_map['zoom']))
+            elif zooms[i] < 0:
+                # The bbox exceeds the Earth, as in project_to_mercator
+                centers_and_zooms.append(((0, 0), 0))
+            else:
+                centers_and_zooms.append((center, int(zooms[i]) + 1))
+        return centers_and_zooms
+
+    def set_overlays_center_and_zoom(self, view_map, overlays):
+        """
+            Stores 'center' and 'zoom' on every overlay having a bbox, e.g.
+            for the "zoom to layer" actions and thumbnails
+        """
+        _keys = ('minx', 'miny', 'maxx', 'maxy')
+        _overlays = [_o for _o in overlays
+                     if 'crs' in _o.get('bbox', {}) and all(_k in _o['bbox'].get('bounds', {}) for _k in _keys)]
+        bboxes = [[get_valid_number(_o['bbox']['bounds'][_k]) for _k in _keys] for _o in _overlays]
+        crs = [_o['bbox']['crs'] for _o in _overlays]
+        for overlay, (center, zoom) in zip(_overlays, self.get_centers_and_zooms(view_map, bboxes, crs)):
+            overlay['center'] = center
+            overlay['zoom'] = zoom
+
     def project_to_mercator(self, ov_bbox, ov_crs, center=None):
+        zoom = None
         try:
-            srid = int(ov_crs.split(':')[1])
-            srid = 3857 if srid == 900913 else srid
-            poly = Polygon((
-                (ov_bbox[0], ov_bbox[1]),
-                (ov_bbox[0], ov_bbox[3]),
-                (ov_bbox[2], ov_bbox[3]),
-                (ov_bbox[2], ov_bbox[1]),
-                (ov_bbox[0], ov_bbox[1])), srid=srid)
-            gcoord = SpatialReference(4326)
-            ycoord = SpatialReference(srid)
-            trans = CoordTransform(ycoord, gcoord)
-            poly.transform(trans)
+            extent = reproject_bbox(ov_bbox, ov_crs, 4326)
             try:
                 if not center:
                     center = {
-                        "x": get_valid_number(poly.centroid.coords[0]),
-                        "y": get_valid_number(poly.centroid.coords[1]),
+                        "x": get_valid_number(extent[0] + (extent[2] - extent[0]) / 2.),
+                        "y": get_valid_number(extent[1] + (extent[3] - extent[1]) / 2.),
                         "crs": "EPSG:3857"
                     }
-                zoom = GoogleZoom().get_zoom(poly) + 1
+                zoom = GoogleZoom().get_extent_zoom(extent) + 1
             except BaseException:
                 center = (0, 0)
                 zoom = 0
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2019, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import traceback
+
+from collections import namedtuple, OrderedDict
+
+from ..conf import settings, load_path_attr
+from ..utils import reproject_bbox
+
+logger = logging.getLogger(__name__)
+
+# The GXP layer config of a GeoNode Layer, with its 'name', 'capability' and
+# 'source' key, and the GXP source config the key refers to
+LayerContext = namedtuple("LayerContext", ["layer", "source"])
+
+# Attribute of the request the resolved contexts are cached on
+REQUEST_ATTR = '_mapstore2_adapter_layer_contexts'
+
+# Key of the GXP source of the layers served by the local GeoServer
+LOCAL_SOURCE = 'local'
+
+# GetMap and GetFeatureInfo formats of the capability, as GeoNode lists them
+LAYER_FORMATS = [
+    "image/png", "image/png8", "image/jpeg", "image/vnd.jpeg-png", "image/gif", "image/svg+xml",
+    "image/geotiff", "image/tiff", "application/pdf", "application/json;type=utfgrid",
+    "application/vnd.google-earth.kml+xml", "application/vnd.google-earth.kmz", "application/atom+xml",
+    "application/rss+xml", "text/html; subtype=openlayers"]
+LAYER_INFO_FORMATS = [
+    "text/plain", "application/vnd.ogc.gml", "text/xml", "application/vnd.ogc.gml/3.1.1",
+    "text/xml; subtype=gml/3.1.1", "text/html", "application/json"]
+
+# Time dimension of the layers with time info, whose values MapStore2 reads
+# from the WMTS multidim extension
+TIME_DIMENSION = {
+    "name": "time",
+    "units": "ISO8601",
+    "unitsymbol": None,
+    "nearestVal": False,
+    "multipleVal": False,
+    "current": False,
+    "default": "current",
+    "values": []
+}
+
+
+def get_layer_capability(layer):
+    """
+    Returns the GXP capability of the GeoNode `layer`, as the one
+    geonode.layers.views.layer_detail puts into its viewer config, from the
+    layer fields only: the time dimension carries no values, MapStore2 reads
+    them from the WMTS multidim extension.
+
+    The reprojected bboxes are left out if the native SRID of the layer
+    cannot be handled.
+    """
+    srid = layer.srid
+    extent = [float(layer.bbox_x0), float(layer.bbox_y0), float(layer.bbox_x1), float(layer.bbox_y1)]
+    capability = {
+        "abstract": layer.abstract,
+        "name": layer.alternate,
+        "title": layer.title,
+        "prefix": layer.alternate.split(':', 1)[0] if ':' in layer.alternate else "",
+        "queryable": True,
+        "storeType": layer.storeType,
+        "bbox": {
+            srid: {
+                "srs": srid,
+                "bbox": extent
+            }
+        },
+        "srs": {
+            srid: True
+        },
+        "formats": list(LAYER_FORMATS),
+        "infoFormats": list(LAYER_INFO_FORMATS),
+        "styles": [{
+            "name": _style.name,
+            "title": _style.sld_title or _style.name
+        } for _style in layer.styles.all()],
+        "keywords": layer.keyword_list(),
+        "attribution": {
+            "title": layer.owner.username if layer.owner else ""
+        }
+    }
+    if getattr(layer, 'has_time', False):
+        capability["dimensions"] = {
+            "time": dict(TIME_DIMENSION)
+        }
+
+    # Every bbox is [minx, miny, maxx, maxy], as the converter and
+    # set_geonode_map read them; the native one is never replaced
+    try:
+        bboxes = {}
+        for _srid, _srs in ((4326, "EPSG:4326"), (3857, "EPSG:900913")):
+            bboxes[_srs] = {
+                "srs": _srs,
+                "bbox": list(reproject_bbox(extent, srid, _srid))
+            }
+    except BaseException:
+        tb = traceback.format_exc()
+        logger.debug(tb)
+    else:
+        capability["llbbox"] = list(bboxes["EPSG:4326"]["bbox"])
+        bboxes.pop(srid, None)
+        capability["bbox"].update(bboxes)
+    return capability
+
+
+def get_layer_source(layer):
+    "Returns the (key, GXP source) the GeoNode `layer` is served from."
+    service = layer.remote_service if layer.storeType == 'remoteStore' else None
+    if service is None:
+        return (LOCAL_SOURCE, {
+            "ptype": "gxp_wmscsource",
+            "url": layer.ows_url,
+            "restUrl": "/gs/rest"
+        })
+    return (service.name, {
+        "ptype": service.ptype,
+        "remote": True,
+        "url": service.service_url,
+        "name": service.name,
+        "title": "[R] %s" % service.title
+    })
+
+
+def get_geonode_layer_contexts(request, names):
+    """
+    Returns the {name: LayerContext} of the GeoNode Layers, among `names`,
+    `request.user` can view, fetched with a single query.
+    """
+    from guardian.shortcuts import get_objects_for_user
+    from geonode.base.models import ResourceBase
+    from geonode.layers.models import Layer
+
+    if getattr(request, 'user', None) is None:
+        return {}
+
+    allowed_ids = get_objects_for_user(
+        request.user,
+        'base.view_resourcebase',
+        klass=ResourceBase.objects.filter(layer__alternate__in=names)).values('id')
+    layers = Layer.objects.filter(
+        alternate__in=names, id__in=allowed_ids).select_related(
+            'owner', 'remote_service').prefetch_related('styles', 'keywords')
+
+    contexts = {}
+    for _layer in layers:
+        _source_key, _source = get_layer_source(_layer)
+        contexts[_layer.alternate] = LayerContext({
+            "name": _layer.alternate,
+            "source": _source_key,
+            "capability": get_layer_capability(_layer)
+        }, _source)
+    return contexts
+
+
+def get_layer_contexts(names, request=None):
+    """
+    Returns the {name: LayerContext} of the layers `names`, skipping the
+    unknown ones.
+
+    The contexts are resolved at once by the MAPSTORE2_ADAPTER_LAYER_CONTEXTS_PROVIDER
+    callable and cached on the `request`, so that only the names not resolved
+    yet while serving it are looked up.
+    """
+    contexts = getattr(request, REQUEST_ATTR, None)
+    if not isinstance(contexts, dict):
+        contexts = {}
+        if request is not None:
+            setattr(request, REQUEST_ATTR, contexts)
+
+    missing = [_name for _name in OrderedDict.fromkeys(names) if _name and _name not in contexts]
+    if missing:
+        provider = load_path_attr(settings.MAPSTORE2_ADAPTER_LAYER_CONTEXTS_PROVIDER)
+        resolved = provider(request, missing)
+        for _name in missing:
+            contexts[_name] = resolved.get(_name)
+    return dict((_name, contexts[_name]) for _name in names if contexts.get(_name) is not None)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2019, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Permissions evaluated at once on every resolved GeoNode resource
+RESOURCE_PERMS = ('view_resourcebase', 'change_resourcebase', 'delete_resourcebase')
+
+# Attribute of the request the resolver is cached on
+REQUEST_ATTR = '_mapstore2_adapter_permissions'
+
+
+def get_geonode_layer_resource(typename):
+    """
+    Returns the ResourceBase of the GeoNode Layer `typename`, looked up as
+    geonode.layers.views._resolve_layer does, None if there is none.
+    """
+    from geonode.base.models import ResourceBase
+
+    resource = ResourceBase.objects.filter(layer__alternate=typename).first()
+    if resource is None and ':' in typename:
+        _service, _name = typename.split(':', 1)
+        resource = ResourceBase.objects.filter(
+            layer__alternate=_name, layer__remote_service__name=_service).first()
+    return resource
+
+
+def get_geonode_map_resource(map_id):
+    """
+    Returns the ResourceBase of the GeoNode Map `map_id`, either its id or
+    its urlsuffix, as geonode.maps.views._resolve_map does, None if there is none.
+    """
+    from geonode.base.models import ResourceBase
+
+    map_id = str(map_id)
+    key = 'map__pk' if map_id.isdigit() else 'map__urlsuffix'
+    return ResourceBase.objects.filter(**{key: map_id}).first()
+
+
+class PermissionResolver(object):
+    """
+    Resolves the RESOURCE_PERMS of the requesting user on GeoNode Layers and
+    Maps, fetching every resource once and checking all the permissions with
+    a single guardian lookup. Results are kept for the lifetime of the
+    resolver, i.e. of the request it is attached to.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self._perms = {}
+
+    def get_layer_perms(self, typename):
+        "Returns the {codename: bool} permissions on the Layer `typename`."
+        return self._get_perms(('layer', typename), get_geonode_layer_resource, typename)
+
+    def get_map_perms(self, map_id):
+        "Returns the {codename: bool} permissions on the Map `map_id`."
+        return self._get_perms(('map', str(map_id)), get_geonode_map_resource, map_id)
+
+    def _get_perms(self, key, loader, *args):
+        if key not in self._perms:
+            perms = dict.fromkeys(RESOURCE_PERMS, False)
+            user = getattr(self.request, 'user', None)
+            if user is not None:
+                try:
+                    resource = loader(*args)
+                    if resource is not None:
+                        perms.update(self.check_perms(user, resource))
+                except BaseException:
+                    tb = traceback.format_exc()
+                    logger.debug(tb)
+            self._perms[key] = perms
+        return self._perms[key]
+
+    def check_perms(self, user, resource):
+        "Returns the {codename: bool} RESOURCE_PERMS of `user` on `resource`."
+        from guardian.core import ObjectPermissionChecker
+
+        granted = set(ObjectPermissionChecker(user).get_perms(resource))
+        return dict((_perm, _perm in granted) for _perm in RESOURCE_PERMS)
+
+
+def get_permission_resolver(request):
+    """
+    Returns the PermissionResolver of `request`, attached to it on first use
+    so that the adapter calls serving the same request share the results.
+    Without a request, every permission is denied.
+    """
+    if request is None:
+        return PermissionResolver(None)
+    resolver = getattr(request, REQUEST_ATTR, None)
+    if not isinstance(resolver, PermissionResolver):
+        resolver = PermissionResolver(request)
+        setattr(request, REQUEST_ATTR, resolver)
+    return resolver
@@ -13,22 +13,38 @@ from __future__ import absolute_import
 
 from ..api.models import (MapStoreData,
                           MapStoreAttribute)
+from ..conf import settings, load_path_attr
+from .layers import get_layer_contexts
+from .permissions import get_permission_resolver
 
 from rest_framework.exceptions import APIException
 
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
-
 import base64
 import logging
 import traceback
-from django.http import Http404
+from collections import OrderedDict
+from django.db import transaction
+from django.db.models import Case, Value, When
 
 logger = logging.getLogger(__name__)
 
 
+def get_geonode_allowed_map_ids(request, queryset):
+    """
+    Returns the ids, among `queryset`, of the GeoNode Maps `request.user` can
+    view, as a subquery resolved by the database along with the queryset.
+    Layers and Documents sharing an id with a resource are left out.
+    """
+    from guardian.shortcuts import get_objects_for_user
+    from geonode.base.models import ResourceBase
+
+    return get_objects_for_user(
+        request.user,
+        'base.view_resourcebase',
+        klass=ResourceBase.objects.filter(
+            id__in=queryset.values('id'), map__isnull=False)).values('id')
+
+
 class GeoNodeSerializer(object):
 
     @classmethod
@@ -43,42 +59,81 @@ class GeoNodeSerializer(object):
 
     @classmethod
     def update_attributes(cls, serializer, attributes):
-        _attributes = []
+        """
+        Upserts the resource attributes with a fixed number of queries: the
+        existing ones are fetched once, then created, updated and deleted in
+        bulk within a single transaction.
+        """
+        _resource = serializer.instance
+        _values = OrderedDict()
         for _a in attributes:
-            attribute, created = MapStoreAttribute.objects.get_or_create(
-                name=_a['name'],
-                resource=serializer.instance)
-            attribute.resource = serializer.instance
-            attribute.name = _a['name']
-            attribute.type = _a['type']
-            attribute.label = _a['label']
-            attribute.value = base64.encodestring(_a['value'].encode('utf8'))
-            attribute.save()
-            _attributes.append(attribute)
-        serializer.validated_data['attributes'] = _attributes
+            _values[_a['name']] = _a
+
+        with transaction.atomic():
+            _existing = list(MapStoreAttribute.objects.filter(resource=_resource))
+            _by_name = dict((_a.name, _a) for _a in _existing)
+            _to_create = []
+            _to_update = []
+            for _name, _a in _values.items():
+                attribute = _by_name.get(_name)
+                if attribute is None:
+                    attribute = MapStoreAttribute(resource=_resource, name=_name)
+                    _to_create.append(attribute)
+                else:
+                    _to_update.append(attribute)
+                attribute.type = _a['type']
+                attribute.label = _a['label']
+                attribute.value = base64.encodestring(_a['value'].encode('utf8'))
+
+            _kept = set(_a.id for _a in _to_update)
+            _stale = [_a.id for _a in _existing if _a.id not in _kept]
+            if _stale:
+                MapStoreAttribute.objects.filter(id__in=_stale).delete()
+            if _to_create:
+                MapStoreAttribute.objects.bulk_create(_to_create)
+            if _to_update:
+                # A single UPDATE ... SET field = CASE id WHEN ... for all of them
+                MapStoreAttribute.objects.filter(id__in=_kept).update(**dict(
+                    (_field, Case(*[When(id=_a.id, then=Value(getattr(_a, _field))) for _a in _to_update],
+                                  output_field=MapStoreAttribute._meta.get_field(_field)))
+                    for _field in ('type', 'label', 'value')))
+
+            # bulk_create does not set the primary keys on every database
+            _by_name = dict((_a.name, _a) for _a in MapStoreAttribute.objects.filter(resource=_resource))
+        serializer.validated_data['attributes'] = [_by_name[_name] for _name in _values]
 
     def get_queryset(self, caller, queryset):
-        allowed_map_ids = []
-        for _q in queryset:
-            mapid = _q.id
+        """
+        Filters the resources the requesting user can view.
+
+        The allowed ids are resolved at once by the MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER
+        callable; if unset, or failing, every resource is checked one by one.
+        """
+        allowed_map_ids = None
+        if settings.MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER:
             try:
-                from geonode.maps.views import (_resolve_map,
-                                                _PERMISSION_MSG_VIEW)
-                map_obj = _resolve_map(
-                    caller.request,
-                    str(mapid),
-                    'base.view_resourcebase',
-                    _PERMISSION_MSG_VIEW)
-                if map_obj:
-                    allowed_map_ids.append(mapid)
+                provider = load_path_attr(settings.MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER)
+                allowed_map_ids = provider(caller.request, queryset)
             except BaseException:
                 tb = traceback.format_exc()
                 logger.error(tb)
 
+        if allowed_map_ids is None:
+            allowed_map_ids = self.resolve_allowed_map_ids(caller, queryset)
+
         # queryset = queryset.filter(user=self.request.user)
         queryset = queryset.filter(id__in=allowed_map_ids)
         return queryset
 
+    def resolve_allowed_map_ids(self, caller, queryset):
+        resolver = get_permission_resolver(caller.request)
+        allowed_map_ids = []
+        for _q in queryset:
+            mapid = _q.id
+            if resolver.get_map_perms(mapid)['view_resourcebase']:
+                allowed_map_ids.append(mapid)
+        return allowed_map_ids
+
     def get_geonode_map(self, caller, serializer):
         from geonode.maps.views import _PERMISSION_MSG_SAVE
         try:
@@ -147,31 +202,19 @@ class GeoNodeSerializer(object):
                     "title": _map_title,
                     "abstract": _map_abstract}
                 _map_conf['sources'] = {}
-                from geonode.layers.views import layer_detail
                 _map_obj = data.pop('map', None)
                 if _map_obj:
+                    # Retrieve the Layer Params back from GeoNode
+                    _layer_contexts = get_layer_contexts(
+                        [_lyr.get('name') for _lyr in _map_obj['layers']],
+                        request=caller.request)
                     _map_bbox = []
                     for _lyr in _map_obj['layers']:
                         _lyr_context = {}
-                        try:
-                            # Retrieve the Layer Params back from GeoNode
-                            _gn_layer = layer_detail(
-                                caller.request,
-                                _lyr['name'])
-                            if _gn_layer and _gn_layer.context_data:
-                                _context_data = json.loads(_gn_layer.context_data['viewer'])
-                                for _gn_layer_ctx in _context_data['map']['layers']:
-                                    if 'name' in _gn_layer_ctx and _gn_layer_ctx['name'] == _lyr['name']:
-                                        if 'style' in _lyr:
-                                            _lyr_context['style'] = _lyr['style']
-                                        _lyr_context = _gn_layer_ctx
-                                        _src_idx = _lyr_context['source']
-                                        _map_conf['sources'][_src_idx] = _context_data['sources'][_src_idx]
-                        except Http404:
-                            tb = traceback.format_exc()
-                            logger.debug(tb)
-                        except BaseException:
-                            raise
+                        _gn_layer = _layer_contexts.get(_lyr.get('name'))
+                        if _gn_layer:
+                            _lyr_context = _gn_layer.layer
+                            _map_conf['sources'][_lyr_context['source']] = _gn_layer.source
                         # Store ms2 layer idq
                         if "id" in _lyr and _lyr["id"]:
                             _lyr['extraParams'] = {"msId": _lyr["id"]}
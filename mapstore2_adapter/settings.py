@@ -9,8 +9,11 @@
 #
 #########################################################################
 
+import logging
+
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
 
 try:
     settings.TEMPLATES[0]['OPTIONS']['context_processors'] += ['mapstore2_adapter.context_processors.resource_urls',]
@@ -28,3 +31,43 @@ MAP_DEBUG = getattr(settings, "MAPSTORE_DEBUG", False)
 MAP_BASELAYERS = getattr(settings, "MAPSTORE_BASELAYERS", [])
 CATALOGUE_SERVICES = getattr(settings, "MAPSTORE_CATALOGUE_SERVICES", {})
 CATALOGUE_SELECTED_SERVICE = getattr(settings, "MAPSTORE_CATALOGUE_SELECTED_SERVICE", None)
+
+
+def get_baselayers_index(baselayers):
+    """
+    Returns the name -> position index of the `baselayers`; the first one
+    wins among homonyms and the ones without a name are skipped.
+    """
+    index = {}
+    for _i, _baselayer in enumerate(baselayers):
+        _name = _baselayer.get('name') if isinstance(_baselayer, dict) else None
+        if _name is not None and _name not in index:
+            index[_name] = _i
+    return index
+
+
+MAP_BASELAYERS_INDEX = get_baselayers_index(MAP_BASELAYERS)
+
+
+def validate_settings():
+    """
+    Checks the MapStore2 baselayers and catalogue settings, logging a warning
+    for every entry the converter would skip or fail on; returns the warnings.
+    """
+    warnings = []
+    if not isinstance(MAP_BASELAYERS, (list, tuple)):
+        warnings.append("MAPSTORE_BASELAYERS must be a list")
+    else:
+        for _i, _baselayer in enumerate(MAP_BASELAYERS):
+            if not isinstance(_baselayer, dict):
+                warnings.append("MAPSTORE_BASELAYERS[%s] is not a dict" % _i)
+            elif 'type' not in _baselayer:
+                warnings.append("MAPSTORE_BASELAYERS[%s] has no 'type'" % _i)
+    if not isinstance(CATALOGUE_SERVICES, dict):
+        warnings.append("MAPSTORE_CATALOGUE_SERVICES must be a dict")
+    elif CATALOGUE_SELECTED_SERVICE and CATALOGUE_SELECTED_SERVICE not in CATALOGUE_SERVICES:
+        warnings.append("MAPSTORE_CATALOGUE_SELECTED_SERVICE '%s' is not among the "
+                        "MAPSTORE_CATALOGUE_SERVICES" % CATALOGUE_SELECTED_SERVICE)
+    for _warning in warnings:
+        logger.warning(_warning)
+    return warnings
@@ -11,33 +11,288 @@
 
 from __future__ import unicode_literals
 
-from math import atan, exp, log, pi, sin, isnan, isinf
-try:
-    import json
-except ImportError:
-    from django.utils import simplejson as json
+import logging
+import threading
+import traceback
 
+from collections import namedtuple, OrderedDict
+from math import atan, cos, exp, floor, log, pi, sin, tan, isnan, isinf
 try:
     from urlparse import urljoin
 except BaseException:
     # Python 3+
     from urllib.parse import urljoin
 
-from mapstore2_adapter import DjangoMapstore2AdapterBaseException
+from mapstore2_adapter import DjangoMapstore2AdapterBaseException, json_backend
+from mapstore2_adapter.conf import settings
 
-from django.conf import settings
+from django.utils.six import string_types
 from django.utils.six.moves import range
 try:
     from django.core.urlresolvers import reverse
 except BaseException:
     # Django 2.0
     from django.urls import reverse
-from django.contrib.gis.geos import GEOSGeometry, LinearRing, Point, Polygon
+
+logger = logging.getLogger(__name__)
 
 # Constants used for degree to radian conversion, and vice-versa.
 DTOR = pi / 180.
 RTOD = 180. / pi
 
+# Radius of the sphere used by the Spherical (Web) Mercator projection.
+MERCATOR_RADIUS = 6378137.
+# Latitude at which the Spherical Mercator projection gets square.
+MERCATOR_MAX_LAT = 85.0511287798066
+
+# GDAL, GEOS and NumPy are imported on first use through the accessors
+# below, so that importing the adapter does not load them.
+_numpy = []
+
+
+def get_gdal():
+    "Returns django.contrib.gis.gdal, imported on first use."
+    from django.contrib.gis import gdal
+    return gdal
+
+
+def get_geos():
+    "Returns django.contrib.gis.geos, imported on first use."
+    from django.contrib.gis import geos
+    return geos
+
+
+def get_numpy():
+    "Returns NumPy, imported on first use, or None when it is not installed."
+    if not _numpy:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy.append(numpy)
+    return _numpy[0]
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache(object):
+    """
+    A bounded, thread-safe, least recently used cache which keeps track of
+    its hits and misses, in the spirit of `functools.lru_cache`.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_create(self, key, factory):
+        """
+        Returns the value cached for `key`, storing `factory()` on a miss.
+
+        `factory` runs outside of the lock, so threads missing the same key at
+        once may all call it; the first value stored is the one kept.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data[key] = value
+                return value
+
+        value = factory()
+        with self._lock:
+            value = self._data.pop(key, value)
+            self._data[key] = value
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def cache_clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+srs_cache = LRUCache(maxsize=settings.MAPSTORE2_ADAPTER_SRS_CACHE_SIZE)
+
+# Per thread {(source SRID, target SRID): CoordTransform}, see get_coord_transform
+transform_cache = threading.local()
+
+
+def normalize_srid(srid):
+    "Returns the integer SRID of `srid`, given either as int or as 'EPSG:XXXX'."
+    if not isinstance(srid, int):
+        srid = int(str(srid).split(':')[-1])
+    return 3857 if srid == 900913 else srid
+
+
+def get_spatial_reference(srid):
+    "Returns the process-wide cached GDAL SpatialReference for `srid`."
+    srid = normalize_srid(srid)
+    return srs_cache.get_or_create(('srs', srid), lambda: get_gdal().SpatialReference(srid))
+
+
+def get_coord_transform(source_srid, target_srid):
+    """
+    Returns a cached GDAL CoordTransform from `source_srid` to `target_srid`.
+
+    GDAL coordinate transformations are not re-entrant, hence every thread
+    gets its own transforms, built from the shared spatial references.
+    """
+    source_srid, target_srid = normalize_srid(source_srid), normalize_srid(target_srid)
+    transforms = getattr(transform_cache, 'transforms', None)
+    if transforms is None:
+        transforms = transform_cache.transforms = {}
+    transform = transforms.get((source_srid, target_srid))
+    if transform is None:
+        transform = get_gdal().CoordTransform(get_spatial_reference(source_srid),
+                                              get_spatial_reference(target_srid))
+        transforms[(source_srid, target_srid)] = transform
+    return transform
+
+
+def mercator_to_lonlat(x, y):
+    "Converts Spherical Mercator (EPSG:3857) coordinates to longitude, latitude."
+    return (x / MERCATOR_RADIUS * RTOD,
+            (2 * atan(exp(y / MERCATOR_RADIUS)) - 0.5 * pi) * RTOD)
+
+
+def lonlat_to_mercator(lon, lat):
+    "Converts longitude, latitude to Spherical Mercator (EPSG:3857) coordinates."
+    lat = min(max(lat, -MERCATOR_MAX_LAT), MERCATOR_MAX_LAT)
+    return (lon * DTOR * MERCATOR_RADIUS,
+            log(tan(0.25 * pi + 0.5 * lat * DTOR)) * MERCATOR_RADIUS)
+
+
+# Closed-form transforms for the most common pairs of SRIDs, sparing GDAL
+# on the hot path. EPSG:900913 is normalized to EPSG:3857 beforehand.
+FAST_TRANSFORMS = {
+    (3857, 4326): mercator_to_lonlat,
+    (4326, 3857): lonlat_to_mercator,
+}
+
+
+def transform_bbox(bbox, source_srid, target_srid):
+    """
+    Reprojects the (xmin, ymin, xmax, ymax) `bbox` through GDAL and returns
+    the extent of the result.
+    """
+    xmin, ymin, xmax, ymax = bbox
+    poly = get_geos().Polygon((
+        (xmin, ymin),
+        (xmin, ymax),
+        (xmax, ymax),
+        (xmax, ymin),
+        (xmin, ymin)), srid=normalize_srid(source_srid))
+    poly.transform(get_coord_transform(source_srid, target_srid))
+    return poly.extent
+
+
+def reproject_bbox(bbox, source_srid, target_srid):
+    """
+    Returns the (xmin, ymin, xmax, ymax) extent of `bbox` reprojected from
+    `source_srid` to `target_srid`.
+
+    Pairs listed in `FAST_TRANSFORMS` are reprojected by transforming the
+    four corners in pure Python; any other pair falls back to GDAL.
+    """
+    xmin, ymin = min(bbox[0], bbox[2]), min(bbox[1], bbox[3])
+    xmax, ymax = max(bbox[0], bbox[2]), max(bbox[1], bbox[3])
+    source_srid, target_srid = normalize_srid(source_srid), normalize_srid(target_srid)
+    if source_srid == target_srid:
+        return (xmin, ymin, xmax, ymax)
+
+    transform = FAST_TRANSFORMS.get((source_srid, target_srid))
+    if transform is None:
+        return transform_bbox((xmin, ymin, xmax, ymax), source_srid, target_srid)
+
+    corners = [transform(x, y) for x, y in ((xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin))]
+    xs = [c[0] for c in corners]
+    ys = [c[1] for c in corners]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def _mercator_to_lonlat_array(x, y):
+    "Vectorized `mercator_to_lonlat` for NumPy arrays."
+    numpy = get_numpy()
+    return (x / MERCATOR_RADIUS * RTOD,
+            (2 * numpy.arctan(numpy.exp(y / MERCATOR_RADIUS)) - 0.5 * pi) * RTOD)
+
+
+def _lonlat_to_mercator_array(lon, lat):
+    "Vectorized `lonlat_to_mercator` for NumPy arrays."
+    numpy = get_numpy()
+    lat = numpy.clip(lat, -MERCATOR_MAX_LAT, MERCATOR_MAX_LAT)
+    return (lon * DTOR * MERCATOR_RADIUS,
+            numpy.log(numpy.tan(0.25 * pi + 0.5 * lat * DTOR)) * MERCATOR_RADIUS)
+
+
+FAST_ARRAY_TRANSFORMS = {
+    (3857, 4326): _mercator_to_lonlat_array,
+    (4326, 3857): _lonlat_to_mercator_array,
+}
+
+
+def reproject_bboxes(bboxes, source_srids, target_srid):
+    """
+    Vectorized `reproject_bbox`, requires NumPy.
+
+    `bboxes` is an (N, 4) array of (xmin, ymin, xmax, ymax) rows and
+    `source_srids` the N matching SRIDs. Returns an (N, 4) array of extents,
+    whose rows are NaN where the SRID could not be handled.
+    """
+    numpy = get_numpy()
+    bboxes = numpy.asarray(bboxes, dtype=float).reshape(-1, 4)
+    xmin = numpy.minimum(bboxes[:, 0], bboxes[:, 2])
+    ymin = numpy.minimum(bboxes[:, 1], bboxes[:, 3])
+    xmax = numpy.maximum(bboxes[:, 0], bboxes[:, 2])
+    ymax = numpy.maximum(bboxes[:, 1], bboxes[:, 3])
+    target_srid = normalize_srid(target_srid)
+
+    groups = {}
+    for i, srid in enumerate(source_srids):
+        try:
+            groups.setdefault(normalize_srid(srid), []).append(i)
+        except (TypeError, ValueError, AttributeError):
+            pass
+
+    extents = numpy.full(bboxes.shape, numpy.nan)
+    for srid, rows in groups.items():
+        rows = numpy.asarray(rows)
+        if srid == target_srid:
+            extents[rows] = numpy.column_stack((xmin[rows], ymin[rows], xmax[rows], ymax[rows]))
+            continue
+
+        transform = FAST_ARRAY_TRANSFORMS.get((srid, target_srid))
+        if transform is None:
+            for i in rows:
+                try:
+                    extents[i] = transform_bbox((xmin[i], ymin[i], xmax[i], ymax[i]), srid, target_srid)
+                except BaseException:
+                    tb = traceback.format_exc()
+                    logger.debug(tb)
+            continue
+
+        xs, ys = zip(*[transform(x[rows], y[rows]) for x, y in
+                       ((xmin, ymin), (xmin, ymax), (xmax, ymax), (xmax, ymin))])
+        extents[rows] = numpy.column_stack((numpy.minimum.reduce(xs), numpy.minimum.reduce(ys),
+                                            numpy.maximum.reduce(xs), numpy.maximum.reduce(ys)))
+    return extents
+
 
 class GoogleZoom(object):
     """
@@ -86,7 +341,9 @@ class GoogleZoom(object):
 
     def get_lon_lat(self, lonlat):
         "Unpacks longitude, latitude from GEOS Points and 2-tuples."
-        if isinstance(lonlat, Point):
+        if isinstance(lonlat, tuple):
+            lon, lat = lonlat
+        elif isinstance(lonlat, get_geos().Point):
             lon, lat = lonlat.coords
         else:
             lon, lat = lonlat
@@ -138,6 +395,17 @@ class GoogleZoom(object):
         Google Tile for the given longitude/latitude pair and zoom level. This
         tile is used to determine the size of a tile at the given point.
         """
+        ll, ur = self.tile_corners(lonlat, zoom)
+
+        # Constructing the Polygon, representing the tile and returning.
+        geos = get_geos()
+        return geos.Polygon(geos.LinearRing(ll, (ll[0], ur[1]), ur, (ur[0], ll[1]), ll), srid=4326)
+
+    def tile_corners(self, lonlat, zoom):
+        """
+        Returns the lower-left and upper-right longitude/latitude pairs of the
+        fictional Google Tile returned by `tile`.
+        """
         # The given lonlat is the center of the tile.
         delta = self._tilesize / 2
 
@@ -149,24 +417,24 @@ class GoogleZoom(object):
         # for the bounding box of the tile.
         ll = self.pixel_to_lonlat((px[0] - delta, px[1] - delta), zoom)
         ur = self.pixel_to_lonlat((px[0] + delta, px[1] + delta), zoom)
-
-        # Constructing the Polygon, representing the tile and returning.
-        return Polygon(LinearRing(ll, (ll[0], ur[1]), ur, (ur[0], ll[1]), ll), srid=4326)
+        return ll, ur
 
     def get_bounds_zoom(self, bounds, srid=4326):
-        "Returns the optimal Zoom level for the given geometry."
-        geom = Polygon((
-            (bounds[0], bounds[1]),
-            (bounds[0], bounds[3]),
-            (bounds[2], bounds[3]),
-            (bounds[2], bounds[1]),
-            (bounds[0], bounds[1])), srid=srid)
-        return self.get_zoom(geom)
+        "Returns the optimal Zoom level for the given bounds, in WGS84."
+        if srid != 4326:
+            raise TypeError('get_bounds_zoom() expects bounds with an SRID of 4326.')
+        return self.get_extent_zoom(reproject_bbox(bounds, srid, 4326))
 
     def get_zoom(self, geom):
-        "Returns the optimal Zoom level for the given geometry."
+        """
+        Returns the optimal Zoom level for the given geometry.
+
+        This is the reference implementation walking through the zoom levels
+        with GEOS tiles; `get_extent_zoom` gives the same results without
+        building any GEOS object.
+        """
         # Checking the input type.
-        if not isinstance(geom, GEOSGeometry) or geom.srid != 4326:
+        if not isinstance(geom, get_geos().GEOSGeometry) or geom.srid != 4326:
             raise TypeError('get_zoom() expects a GEOS Geometry with an SRID of 4326.')
 
         # Getting the envelope for the geometry, and its associated width, height
@@ -190,12 +458,111 @@ class GoogleZoom(object):
         # Otherwise, we've zoomed in to the max.
         return self._nzoom - 1
 
+    def get_extent_zoom(self, extent):
+        """
+        Returns the optimal Zoom level for the given (xmin, ymin, xmax, ymax)
+        extent in WGS84, with plain float math only.
+
+        The zoom level is first estimated in closed form from the ratio
+        between the extent span and the span of a tile (360 / 2^z degrees
+        wide and, around the center latitude, about cos(lat) times as high),
+        then confirmed against the exact tile sizes used by `get_zoom`.
+        """
+        xmin, ymin, xmax, ymax = extent
+        env_w, env_h = xmax - xmin, ymax - ymin
+        center = (xmin + env_w / 2., ymin + env_h / 2.)
+
+        ratios = []
+        if env_w > 0:
+            ratios.append(360. / env_w)
+        if env_h > 0:
+            ratios.append(360. * cos(DTOR * center[1]) / env_h)
+        if ratios:
+            ratio = min(ratios)
+            estimate = int(floor(log(ratio, 2))) if ratio > 0 else -1
+        else:
+            estimate = self._nzoom - 1
+
+        # `z` is the first zoom level whose tile is exceeded by the extent.
+        z = min(max(estimate + 1, 0), self._nzoom)
+        while z > 0 and self._exceeds_tile(env_w, env_h, center, z - 1):
+            z -= 1
+        while z < self._nzoom and not self._exceeds_tile(env_w, env_h, center, z):
+            z += 1
+
+        if z == 0:
+            raise DjangoMapstore2AdapterBaseException(
+                'Geometry width and height should not exceed that of the Earth.')
+        return z - 1
+
+    def get_extents_zoom(self, extents):
+        """
+        Vectorized `get_extent_zoom` for an (N, 4) NumPy array of WGS84
+        extents, requires NumPy. Returns an array of N zoom levels where the
+        extents exceeding the Earth get -1 instead of raising.
+        """
+        numpy = get_numpy()
+        extents = numpy.asarray(extents, dtype=float).reshape(-1, 4)
+        env_w = extents[:, 2] - extents[:, 0]
+        env_h = extents[:, 3] - extents[:, 1]
+        center_lon = extents[:, 0] + env_w / 2.
+        center_lat = extents[:, 1] + env_h / 2.
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ratio = numpy.minimum(
+                numpy.where(env_w > 0, 360. / env_w, numpy.inf),
+                numpy.where(env_h > 0, 360. * numpy.cos(DTOR * center_lat) / env_h, numpy.inf))
+            estimate = numpy.where(
+                numpy.isinf(ratio), self._nzoom - 1,
+                numpy.where(ratio > 0, numpy.floor(numpy.log2(ratio)), -1))
+
+        # `z` is the first zoom level whose tile is exceeded by the extent.
+        z = numpy.clip(estimate + 1, 0, self._nzoom).astype(int)
+        for _ in range(self._nzoom):
+            down = (z > 0) & self._exceeds_tiles(env_w, env_h, center_lon, center_lat, z - 1)
+            if not down.any():
+                break
+            z -= down
+        for _ in range(self._nzoom):
+            up = (z < self._nzoom) & ~self._exceeds_tiles(env_w, env_h, center_lon, center_lat, z)
+            if not up.any():
+                break
+            z += up
+        return z - 1
+
+    def _exceeds_tiles(self, env_w, env_h, lon, lat, zoom):
+        "Vectorized `_exceeds_tile`, zoom levels out of range are clipped."
+        numpy = get_numpy()
+        zoom = numpy.clip(zoom, 0, self._nzoom - 1)
+        npix = numpy.asarray(self._npix, dtype=float)[zoom]
+        degpp = numpy.asarray(self._degpp, dtype=float)[zoom]
+        radpp = numpy.asarray(self._radpp, dtype=float)[zoom]
+        delta = self._tilesize / 2
+
+        # Same math as `lonlat_to_pixel` and `pixel_to_lonlat`.
+        px_x = numpy.round(npix + (lon * degpp))
+        fac = numpy.clip(numpy.sin(DTOR * lat), -0.9999, 0.9999)
+        px_y = numpy.round(npix + (0.5 * numpy.log((1 + fac) / (1 - fac)) * (-1.0 * radpp)))
+
+        def to_lat(py):
+            return RTOD * (2 * numpy.arctan(numpy.exp((py - npix) / (-1.0 * radpp))) - 0.5 * pi)
+
+        tile_w = numpy.abs(((px_x + delta) - npix) / degpp - ((px_x - delta) - npix) / degpp)
+        tile_h = numpy.abs(to_lat(px_y + delta) - to_lat(px_y - delta))
+        return (env_w > tile_w) | (env_h > tile_h)
+
+    def _exceeds_tile(self, env_w, env_h, center, zoom):
+        "Whether the given width and height exceed the tile centered at `center`."
+        ll, ur = self.tile_corners(center, zoom)
+        return (env_w > abs(ur[0] - ll[0])) or (env_h > abs(ur[1] - ll[1]))
+
     def get_width_height(self, extent):
         """
         Returns the width and height for the given extent.
         """
         # Getting the lower-left, upper-left, and upper-right
         # coordinates from the extent.
+        Point = get_geos().Point
         ll = Point(extent[:2])
         ul = Point(extent[0], extent[3])
         ur = Point(extent[2:])
@@ -230,13 +597,29 @@ def get_valid_number(number, default=None, complementar=False):
     return 0
 
 
-def to_json(config):
-    try:
-        basestring  # noqa
-    except NameError:
-        # Python 3 does not declare basetring anymore
-        basestring = str
+def iter_json(obj, chunk_size=64 * 1024):
+    """
+    Encodes `obj` as convert does, sorted keys and DjangoJSONEncoder types,
+    yielding chunks of about `chunk_size` characters instead of a single
+    string, e.g. for a StreamingHttpResponse.
+    """
+    backend = json_backend.get_backend()
+    encoder = json_backend.get_json_encoder()(sort_keys=True,
+                                              separators=backend.separators,
+                                              ensure_ascii=backend.ensure_ascii)
+    buffer, size = [], 0
+    for _chunk in encoder.iterencode(obj):
+        buffer.append(_chunk)
+        size += len(_chunk)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
 
-    if isinstance(config, basestring):
-        return json.loads(config)
+def to_json(config):
+    """Parses a JSON string; already parsed objects are returned as they are."""
+    if isinstance(config, string_types):
+        return json_backend.loads(config)
     return config
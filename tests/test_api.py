@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import unicode_literals
+
+import json
+import logging
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from mapstore2_adapter.api.models import (MapStoreData,
+                                          MapStoreResource)
+
+
+logger = logging.getLogger(__name__)
+
+UserModel = get_user_model()
+
+RESOURCES_URL = '/o/rest/resources/'
+
+
+def get_all_resource_ids(request, queryset):
+    return queryset.values('id')
+
+
+def get_first_resource_ids(request, queryset):
+    return queryset.exclude(id=1001).values('id')
+
+
+class BaseTest(TestCase):
+
+    def setUp(self):
+        self.foo_user = UserModel.objects.create_user("foo_user", "test@example.com", "123456")
+        self.bar_user = UserModel.objects.create_user("bar_user", "dev@example.com", "123456")
+
+    def tearDown(self):
+        self.foo_user.delete()
+        self.bar_user.delete()
+
+
+@override_settings(MAPSTORE2_ADAPTER_SERIALIZER="mapstore2_adapter.plugins.serializers.GeoNodeSerializer",
+                   MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER="tests.test_api.get_all_resource_ids")
+class TestMapStoreResourceViewSet(BaseTest):
+
+    def create_resources(self, num_resources):
+        MapStoreResource.objects.all().delete()
+        for i in range(num_resources):
+            resource = MapStoreResource.objects.create(
+                id=1000 + i, user=self.foo_user, name='map_%s' % i)
+            resource.data = MapStoreData.objects.create(
+                blob={'version': 2, 'map': {'zoom': i}}, resource=resource)
+            resource.save()
+
+    def count_list_queries(self, num_resources, params=''):
+        self.create_resources(num_resources)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(RESOURCES_URL + params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_list_query_count(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+
+        queries, _ = self.count_list_queries(2)
+        self.assertEqual(self.count_list_queries(10)[0], queries)
+
+        queries, _ = self.count_list_queries(2, '?full=1')
+        full_queries, response = self.count_list_queries(10, '?full=1')
+        self.assertEqual(full_queries, queries)
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(sorted(_r['data']['map']['zoom'] for _r in response.data), list(range(10)))
+
+    @override_settings(MAPSTORE2_ADAPTER_REST_PAGE_SIZE=4)
+    def test_list_pagination(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(10)
+
+        ids = []
+        url = RESOURCES_URL
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(len(response.data['results']) <= 4)
+            ids.extend(_r['id'] for _r in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(ids), list(range(1000, 1010)))
+
+        response = self.client.get(RESOURCES_URL + '?page_size=3')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_list_pagination_disabled(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(3)
+
+        response = self.client.get(RESOURCES_URL)
+        self.assertEqual(len(response.data), 3)
+
+    def test_list_fields_projection(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(3)
+
+        response = self.client.get(RESOURCES_URL + '?full=1&fields=id,name,last_update')
+        self.assertEqual(response.status_code, 200)
+        for _r in response.data:
+            self.assertEqual(set(_r.keys()), set(['id', 'name', 'last_update']))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RESOURCES_URL + '?full=1&fields=id,name')
+        resource_queries = [_q['sql'] for _q in ctx.captured_queries
+                            if MapStoreResource._meta.db_table in _q['sql']]
+        self.assertTrue(resource_queries)
+        for _sql in resource_queries:
+            self.assertNotIn(MapStoreData._meta.db_table, _sql)
+            self.assertNotIn('"creation_date"', _sql)
+
+    def test_retrieve_conditional_get(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(2)
+        url = '%s%s/?full=1' % (RESOURCES_URL, 1000)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for _q in ctx.captured_queries:
+            self.assertNotIn(MapStoreData._meta.db_table, _q['sql'])
+
+        # Another representation of the same resource
+        response = self.client.get('%s%s/' % (RESOURCES_URL, 1000), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        resource = MapStoreResource.objects.get(id=1000)
+        resource.name = 'renamed'
+        resource.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['name'], 'renamed')
+
+    def test_list_conditional_get(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(3)
+
+        response = self.client.get(RESOURCES_URL + '?full=1')
+        etag = response['ETag']
+        # Deletions do not move the latest update, lists have no Last-Modified
+        self.assertFalse(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(RESOURCES_URL + '?full=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for _q in ctx.captured_queries:
+            self.assertNotIn(MapStoreData._meta.db_table, _q['sql'])
+
+        # Permission changes
+        with override_settings(MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER="tests.test_api.get_first_resource_ids"):
+            response = self.client.get(RESOURCES_URL + '?full=1', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), 2)
+
+        MapStoreResource.objects.filter(id=1001).delete()
+        response = self.client.get(RESOURCES_URL + '?full=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_list_resolves_queryset_once(self):
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+        self.create_resources(3)
+
+        with mock.patch('mapstore2_adapter.api.views.hookset') as hookset:
+            hookset.get_queryset.side_effect = lambda caller, queryset: queryset
+            response = self.client.get(RESOURCES_URL + '?full=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(hookset.get_queryset.call_count, 1)
+
+
+class ResourceHookSet(object):
+
+    def get_queryset(self, caller, queryset):
+        return queryset
+
+    def perform_create(self, caller, serializer):
+        pass
+
+    def perform_update(self, caller, serializer):
+        pass
+
+
+class ConcurrentHookSet(ResourceHookSet):
+
+    def perform_update(self, caller, serializer):
+        # Another editor commits while the hook is working
+        MapStoreResource.objects.filter(id=serializer.instance.id).update(version=F('version') + 1)
+        serializer.save()
+
+
+@override_settings(MAPSTORE2_ADAPTER_SERIALIZER="tests.test_api.ResourceHookSet")
+class TestMapStoreResourceConcurrency(BaseTest):
+
+    def setUp(self):
+        super(TestMapStoreResourceConcurrency, self).setUp()
+        self.resource = MapStoreResource.objects.create(id=1000, user=self.foo_user, name='map')
+        self.url = '%s%s/' % (RESOURCES_URL, self.resource.id)
+        self.assertTrue(self.client.login(username='foo_user', password='123456'))
+
+    def put(self, name, etag=None):
+        extra = {'HTTP_IF_MATCH': etag} if etag else {}
+        return self.client.put(self.url, json.dumps({'name': name}),
+                               content_type='application/json', **extra)
+
+    def test_if_match(self):
+        etag = self.client.get(self.url + '?full=1')['ETag']
+
+        self.assertEqual(self.put('first', etag).status_code, 200)
+        self.assertEqual(MapStoreResource.objects.get(id=1000).version, 2)
+
+        # A second editor saving over the same version
+        response = self.put('second', etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(MapStoreResource.objects.get(id=1000).name, 'first')
+
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.put('second', etag).status_code, 200)
+        self.assertEqual(self.put('third', '*').status_code, 200)
+        self.assertEqual(self.put('fourth').status_code, 200)
+
+        resource = MapStoreResource.objects.get(id=1000)
+        self.assertEqual((resource.name, resource.version), ('fourth', 5))
+
+    def test_concurrent_update(self):
+        etag = self.client.get(self.url)['ETag']
+        with override_settings(MAPSTORE2_ADAPTER_SERIALIZER="tests.test_api.ConcurrentHookSet"):
+            response = self.put('first', etag)
+        self.assertEqual(response.status_code, 412)
+
+        # The saves of the hook did not write the stale version back, the
+        # whole request is rolled back
+        resource = MapStoreResource.objects.get(id=1000)
+        self.assertEqual((resource.name, resource.version), ('map', 1))
+
+
+class TestBlobField(BaseTest):
+
+    def test_has_key_lookup(self):
+        for i, blob in enumerate(({'version': 2, 'widgetsConfig': {'widgets': []}},
+                                  {'version': 2, 'map': {'widgetsConfig': None}},
+                                  {'version': 2, 'map': {}})):
+            resource = MapStoreResource.objects.create(id=1000 + i, user=self.foo_user, name='map_%s' % i)
+            resource.data = MapStoreData.objects.create(blob=blob, resource=resource)
+            resource.save()
+
+        matches = MapStoreResource.objects.filter(data__blob__has_key='widgetsConfig')
+        self.assertIn(1000, matches.values_list('id', flat=True))
+        self.assertNotIn(1002, matches.values_list('id', flat=True))
+        if connection.vendor == 'postgresql':
+            self.assertNotIn(1001, matches.values_list('id', flat=True))
+        else:
+            # The text fallback also matches the nested keys
+            self.assertIn(1001, matches.values_list('id', flat=True))
+        self.assertFalse(MapStoreData.objects.filter(blob__has_key='catalogServices').exists())
+
+        self.assertEqual(MapStoreData.objects.get(resource_id=1000).blob['widgetsConfig'], {'widgets': []})
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import unicode_literals
+
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import timeit
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.gis.geos import Polygon
+from django.test import TestCase, override_settings
+
+from mapstore2_adapter import json_backend
+from mapstore2_adapter.hooks import hookset
+from mapstore2_adapter.api.ids import SnowflakeIdGenerator
+from mapstore2_adapter.api.models import MapStoreResource
+from mapstore2_adapter.plugins.geonode import (GeoNodeMapStore2ConfigConverter,
+                                               feature_info_cache,
+                                               get_feature_info_template,
+                                               overlay_cache)
+from mapstore2_adapter.utils import (GoogleZoom,
+                                     reproject_bbox,
+                                     transform_bbox)
+
+from .test_converters import GEONODE_SAMPLE_GXP_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+GeoNodeConfigConverter = GeoNodeMapStore2ConfigConverter()
+
+
+# Lists the modules loaded by importing the converter
+IMPORT_TIME_SCRIPT = """
+import sys
+from django.conf import settings
+settings.INSTALLED_APPS
+import mapstore2_adapter
+import mapstore2_adapter.plugins.geonode
+sys.stdout.write('\\n'.join(sorted(sys.modules)))
+"""
+
+# Modules the adapter loads on first use only
+LAZY_MODULES = (
+    'django.contrib.gis.gdal',
+    'django.contrib.gis.geos',
+    'geonode',
+    'numpy',
+)
+
+
+def best_of(func, repeat=5, number=1):
+    """Returns the best time, in seconds, of a single execution of ``func``."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def large_gxp_config(num_layers=300):
+    """Builds a GXP config with ``num_layers`` copies of the sample overlay."""
+    viewer_obj = json.loads(GEONODE_SAMPLE_GXP_CONFIG)
+    layers = viewer_obj['map']['layers']
+    overlay = [_l for _l in layers if _l.get('group') != 'background'][0]
+    for i in range(num_layers):
+        _layer = copy.deepcopy(overlay)
+        _layer['name'] = '%s_%s' % (overlay['name'], i)
+        _layer['selected'] = False
+        layers.append(_layer)
+    return json.dumps(viewer_obj)
+
+
+class TestConverterBenchmarks(TestCase):
+
+    def test_convert_parses_viewer_once(self):
+        viewer = large_gxp_config()
+
+        with mock.patch('mapstore2_adapter.json_backend.loads', wraps=json_backend.loads) as loads:
+            GeoNodeConfigConverter.convert(viewer, None)
+        parses = [_c for _c in loads.call_args_list if _c[0] and _c[0][0] is viewer]
+        self.assertEqual(len(parses), 1)
+
+        single_parse = best_of(lambda: json_backend.loads(viewer))
+        logger.info("viewer of %s bytes: parse time per request %.2fms (was %.2fms with 3 parses)" % (
+            len(viewer), len(parses) * single_parse * 1000, 3 * single_parse * 1000))
+
+
+class TestStreamingBenchmarks(TestCase):
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc not available")
+    def test_convert_stream_peak_memory(self):
+        viewer_obj = json.loads(large_gxp_config(num_layers=2000))
+
+        def peak(func):
+            tracemalloc.start()
+            try:
+                func()
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        def dumps():
+            return GeoNodeConfigConverter.convert(viewer_obj, None)
+
+        def stream():
+            # Chunks are consumed, e.g. written to the socket, one at a time
+            return sum(len(_c) for _c in GeoNodeConfigConverter.convert_stream(viewer_obj, None))
+
+        self.assertEqual(json.loads(dumps()),
+                         json.loads(''.join(GeoNodeConfigConverter.convert_stream(viewer_obj, None))))
+        logger.info("config of %s layers: peak memory convert %.1fMB, convert_stream %.1fMB" % (
+            len(viewer_obj['map']['layers']), peak(dumps) / 1e6, peak(stream) / 1e6))
+        logger.info("convert %.2fms, convert_stream %.2fms" % (
+            best_of(dumps, repeat=3) * 1000, best_of(stream, repeat=3) * 1000))
+
+
+class TestJSONBackendBenchmarks(TestCase):
+
+    def test_json_backends(self):
+        from .test_json_backend import get_installed_backends
+
+        viewer = large_gxp_config(num_layers=2000)
+        viewer_obj = json.loads(viewer)
+        for _name in get_installed_backends():
+            with override_settings(MAPSTORE2_ADAPTER_JSON_BACKEND=_name):
+                self.assertEqual(json_backend.loads(viewer), viewer_obj)
+                logger.info("%s: decode %.2fms, encode %.2fms, encode sorted %.2fms" % (
+                    _name,
+                    best_of(lambda: json_backend.loads(viewer), repeat=3) * 1000,
+                    best_of(lambda: json_backend.dumps(viewer_obj), repeat=3) * 1000,
+                    best_of(lambda: json_backend.dumps(viewer_obj, sort_keys=True), repeat=3) * 1000))
+
+
+class TestOverlayCacheBenchmarks(TestCase):
+
+    def test_cached_vs_converted_overlays(self):
+        viewer_obj = json.loads(large_gxp_config())
+        overlay_cache.cache_clear()
+
+        with mock.patch('mapstore2_adapter.plugins.geonode.overlay_cache.maxsize', 0):
+            expected = GeoNodeConfigConverter.get_overlays(viewer_obj)[0]
+            converted = best_of(lambda: GeoNodeConfigConverter.get_overlays(viewer_obj))
+        self.assertEqual(GeoNodeConfigConverter.get_overlays(viewer_obj)[0], expected)
+        cached = best_of(lambda: GeoNodeConfigConverter.get_overlays(viewer_obj))
+
+        info = overlay_cache.cache_info()
+        logger.info("%s overlays: converted %.2fms, cached %.2fms, hit ratio %.2f" % (
+            len(expected), converted * 1000, cached * 1000, float(info.hits) / (info.hits + info.misses)))
+
+
+class TestOverlayFieldsBenchmarks(TestCase):
+
+    def test_convert_overlay_per_layer(self):
+        viewer_obj = json.loads(GEONODE_SAMPLE_GXP_CONFIG)
+        layer = viewer_obj['map']['layers'][-1]
+        source = viewer_obj['sources'][layer['source']]
+        projection = viewer_obj['map']['projection']
+
+        overlay = GeoNodeConfigConverter.convert_overlay(layer, source, projection)
+        for _source_key, _target_key, _default, _transform in GeoNodeConfigConverter.OVERLAY_FIELDS:
+            if _source_key in layer and _target_key not in ('dimensions', 'search', 'style'):
+                self.assertEqual(overlay[_target_key], layer[_source_key])
+
+        fields_time = best_of(lambda: GeoNodeConfigConverter.map_fields(
+            layer, {}, GeoNodeConfigConverter.OVERLAY_FIELDS), number=1000)
+        convert_time = best_of(lambda: GeoNodeConfigConverter.convert_overlay(
+            layer, source, projection), number=1000)
+        logger.info("per layer: fields mapping %.1fus, convert_overlay %.1fus" % (
+            fields_time * 1e6, convert_time * 1e6))
+
+
+class TestFeatureInfoBenchmarks(TestCase):
+
+    def test_feature_info_template(self):
+        fields = ['attribute_%s' % _i for _i in range(250)]
+        propertyNames = dict((_f, _f.title()) for _f in fields)
+
+        def concatenated():
+            # The former implementation
+            _template = '<div>'
+            for _field in fields:
+                _template += '<div class="row">'
+                _template += '<div class="col-xs-4" style="font-weight: bold; word-wrap: break-word;">%s</div> \
+                                        <div class="col-xs-8" style="word-wrap: break-word;">${properties.%s}</div>' % \
+                    (propertyNames[_field] if propertyNames[_field] else _field, _field)
+                _template += '</div>'
+            _template += '</div>'
+            return _template
+
+        def joined():
+            feature_info_cache.cache_clear()
+            return get_feature_info_template(fields, propertyNames)
+
+        self.assertEqual(joined(), concatenated())
+        logger.info("featureInfo template of %s fields: concatenated %.1fus, joined %.1fus, cached %.1fus" % (
+            len(fields), best_of(concatenated, number=10) * 1e6, best_of(joined, number=10) * 1e6,
+            best_of(lambda: get_feature_info_template(fields, propertyNames), number=10) * 1e6))
+
+
+class TestGoogleZoomBenchmarks(TestCase):
+
+    def test_extent_zoom_vs_geos_zoom(self):
+        google_zoom = GoogleZoom()
+        extent = (-89.871902282, 14.130479802, -88.711514902, 15.098465755)
+        poly = Polygon.from_bbox(extent)
+        poly.srid = 4326
+
+        self.assertEqual(google_zoom.get_extent_zoom(extent), google_zoom.get_zoom(poly))
+
+        geos_time = best_of(lambda: google_zoom.get_zoom(poly), number=100)
+        math_time = best_of(lambda: google_zoom.get_extent_zoom(extent), number=100)
+        logger.info("GoogleZoom: get_zoom %.1fus, get_extent_zoom %.1fus" % (
+            geos_time * 1e6, math_time * 1e6))
+
+
+class TestReprojectionBenchmarks(TestCase):
+
+    def test_reproject_bbox_vs_gdal(self):
+        bbox = [-10004494.3987, 1589190.41896, -9875320.66639, 1700550.58423]
+
+        gdal_time = best_of(lambda: transform_bbox(bbox, 3857, 4326), number=100)
+        math_time = best_of(lambda: reproject_bbox(bbox, 3857, 4326), number=100)
+        logger.info("EPSG:3857 -> EPSG:4326 bbox: GDAL %.1fus, closed-form %.1fus" % (
+            gdal_time * 1e6, math_time * 1e6))
+
+        project_time = best_of(
+            lambda: GeoNodeConfigConverter.project_to_mercator(bbox, 'EPSG:3857'), number=100)
+        logger.info("project_to_mercator: %.1fus per layer" % (project_time * 1e6))
+
+
+class TestBatchZoomBenchmarks(TestCase):
+
+    def test_batch_vs_single_center_and_zoom(self):
+        viewer_obj = json.loads(large_gxp_config())
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+
+        def single():
+            return [GeoNodeConfigConverter.get_center_and_zoom(viewer_obj['map'], _o) for _o in overlays]
+
+        def batch():
+            GeoNodeConfigConverter.set_overlays_center_and_zoom(viewer_obj['map'], overlays)
+
+        batch()
+        self.assertEqual([(_o['center'], _o['zoom']) for _o in overlays], single())
+
+        logger.info("%s overlays: one at a time %.2fms, batch %.2fms" % (
+            len(overlays), best_of(single) * 1000, best_of(batch) * 1000))
+
+
+class TestHookSetBenchmarks(TestCase):
+
+    @override_settings(MAPSTORE2_ADAPTER_SERIALIZER="tests.test_api.ResourceHookSet")
+    def test_hookset_dispatch(self):
+        from .test_api import ResourceHookSet
+
+        hook = hookset.get_hook()
+        self.assertIsInstance(hook, ResourceHookSet)
+        self.assertIs(hookset.get_hook(), hook)
+        with override_settings(MAPSTORE2_ADAPTER_SERIALIZER="tests.test_api.ResourceHookSet"):
+            self.assertIsNot(hookset.get_hook(), hook)
+
+        def uncached():
+            hookset.clear()
+            return hookset.get_queryset
+
+        cached_time = best_of(lambda: hookset.get_queryset, number=1000)
+        uncached_time = best_of(uncached, number=1000)
+        logger.info("hookset dispatch: cached %.2fus, resolved on every call %.2fus" % (
+            cached_time * 1e6, uncached_time * 1e6))
+
+
+def allocate_snowflake_ids(queue, worker_id, num_ids):
+    "Puts `num_ids` ids, allocated as worker `worker_id`, into `queue`."
+    generator = SnowflakeIdGenerator(worker_id=worker_id)
+    queue.put([generator() for _ in range(num_ids)])
+
+
+class TestIdAllocationBenchmarks(TestCase):
+
+    def test_snowflake_ids_stress(self):
+        generator = SnowflakeIdGenerator(worker_id=3)
+        num_threads, num_ids = 8, 16000
+        results = [None] * num_threads
+
+        def allocate(index):
+            results[index] = [generator() for _ in range(num_ids // num_threads)]
+
+        threads = [threading.Thread(target=allocate, args=(_i, )) for _i in range(num_threads)]
+        start = timeit.default_timer()
+        for _t in threads:
+            _t.start()
+        for _t in threads:
+            _t.join()
+        elapsed = timeit.default_timer() - start
+
+        ids = [_id for _ids in results for _id in _ids]
+        self.assertEqual(len(set(ids)), num_ids)
+        for _ids in results:
+            # Time ordered within each thread, JavaScript safe
+            self.assertEqual(_ids, sorted(_ids))
+            self.assertTrue(_ids[-1] < 2 ** 53)
+        logger.info("%s snowflake ids from %s threads in %.2fs" % (num_ids, num_threads, elapsed))
+
+        user = get_user_model().objects.create_user("foo_user", "test@example.com", "123456")
+        start = timeit.default_timer()
+        MapStoreResource.objects.bulk_create(
+            [MapStoreResource(id=_id, user=user, name='map') for _id in ids], batch_size=500)
+        logger.info("%s resources inserted in %.2fs" % (num_ids, timeit.default_timer() - start))
+        self.assertEqual(MapStoreResource.objects.count(), num_ids)
+
+    def test_snowflake_ids_processes(self):
+        num_processes, num_ids = 4, 4000
+        queue = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=allocate_snowflake_ids, args=(queue, _i, num_ids))
+            for _i in range(num_processes)]
+        for _p in processes:
+            _p.start()
+        results = [queue.get() for _ in processes]
+        for _p in processes:
+            _p.join()
+
+        ids = [_id for _ids in results for _id in _ids]
+        self.assertEqual(len(set(ids)), num_processes * num_ids)
+
+    def test_default_id_allocation(self):
+        # Neither PostgreSQL nor a worker id are required by the defaults
+        self.assertIsNone(settings.MAPSTORE2_ADAPTER_ID_WORKER)
+        user = get_user_model().objects.create_user("foo_user", "test@example.com", "123456")
+        resources = [MapStoreResource.objects.create(user=user, name='map_%s' % _i) for _i in range(10)]
+        self.assertEqual(len(set(_r.id for _r in resources)), 10)
+
+    def test_snowflake_ids_worker_required(self):
+        with override_settings(MAPSTORE2_ADAPTER_ID_WORKER=None):
+            with self.assertRaises(ImproperlyConfigured):
+                SnowflakeIdGenerator()()
+        with self.assertRaises(ImproperlyConfigured):
+            SnowflakeIdGenerator(worker_id=32)()
+
+
+class TestImportTimeBenchmarks(TestCase):
+
+    def test_adapter_lazy_imports(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='tests.settings')
+        process = subprocess.Popen(
+            [sys.executable, '-c', IMPORT_TIME_SCRIPT],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        stdout, stderr = process.communicate()
+        self.assertEqual(process.returncode, 0, stderr)
+
+        modules = stdout.splitlines()
+        self.assertIn('mapstore2_adapter.plugins.geonode', modules)
+        for _module in LAZY_MODULES:
+            self.assertNotIn(_module, modules)
@@ -1,13 +1,27 @@
 from __future__ import unicode_literals
 
+import copy
+import json
 import logging
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.test import TestCase, override_settings
 
-from mapstore2_adapter.utils import to_json
+from mapstore2_adapter.api.models import MapStoreResource
+from mapstore2_adapter.cache import invalidate_converted_config
+from mapstore2_adapter.utils import iter_json, to_json
 from mapstore2_adapter.converters import BaseMapStore2ConfigConverter
-from mapstore2_adapter.plugins.geonode import GeoNodeMapStore2ConfigConverter
+from mapstore2_adapter.plugins.geonode import (MISSING,
+                                               GeoNodeMapStore2ConfigConverter,
+                                               feature_info_cache,
+                                               get_feature_info_template,
+                                               overlay_cache)
 
 
 logger = logging.getLogger(__name__)
@@ -324,6 +338,179 @@ class TestGeoNodeConfigConverter(BaseTest):
 
         self.assertEqual(len(ms2_config['map']['layers']), 12)
 
+    def test_ms2_config_convert_parsed_viewer(self):
+        ms2_config = GeoNodeConfigConverter.convert(GEONODE_SAMPLE_GXP_CONFIG, None)
+        ms2_config_parsed = GeoNodeConfigConverter.convert(to_json(GEONODE_SAMPLE_GXP_CONFIG), None)
+
+        self.assertEqual(ms2_config_parsed, ms2_config)
+
+    def test_ms2_config_convert_stream(self):
+        ms2_config = GeoNodeConfigConverter.convert(GEONODE_SAMPLE_GXP_CONFIG, None)
+        chunks = list(GeoNodeConfigConverter.convert_stream(GEONODE_SAMPLE_GXP_CONFIG, None))
+
+        # Same document, whitespace may differ according to the JSON backend
+        self.assertEqual(json.loads(''.join(chunks)), json.loads(ms2_config))
+        self.assertEqual(''.join(iter_json(to_json(ms2_config), chunk_size=16)),
+                         ''.join(iter_json(to_json(ms2_config))))
+
+    def test_overlay_cache(self):
+        overlay_cache.cache_clear()
+        viewer_obj = to_json(GEONODE_SAMPLE_GXP_CONFIG)
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        self.assertEqual(overlay_cache.cache_info().hits, 0)
+        self.assertEqual(overlay_cache.cache_info().misses, len(overlays))
+
+        overlays[0]['center'] = {'x': 0, 'y': 0}
+        overlays[0]['bbox']['bounds']['minx'] = 0
+        cached_overlays, cached_selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        self.assertEqual(overlay_cache.cache_info().hits, len(overlays))
+        self.assertNotIn('center', cached_overlays[0])
+        self.assertNotEqual(cached_overlays[0]['bbox']['bounds']['minx'], 0)
+        self.assertEqual(cached_selected['name'], selected['name'])
+
+        # The layer entries are mapped again on every call
+        viewer_obj['map']['layers'][-1]['opacity'] = 0.5
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        self.assertEqual(overlays[-1]['opacity'], 0.5)
+        self.assertEqual(overlay_cache.cache_info().misses, len(overlays))
+
+        # Capability changes, e.g. edited metadata or extent, are converted again
+        capa = viewer_obj['map']['layers'][-1]['capability']
+        capa['abstract'] = 'Edited abstract'
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        self.assertEqual(overlays[-1]['abstract'], 'Edited abstract')
+        self.assertEqual(overlay_cache.cache_info().misses, len(overlays) + 1)
+
+        capa['bbox'][viewer_obj['map']['projection']]['bbox'] = [0, 0, 10, 10]
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        self.assertEqual(overlays[-1]['bbox']['bounds'], {'minx': 0, 'miny': 0, 'maxx': 10, 'maxy': 10})
+        self.assertEqual(overlay_cache.cache_info().misses, len(overlays) + 2)
+
+        with mock.patch('mapstore2_adapter.plugins.geonode.overlay_cache.maxsize', 0):
+            self.assertEqual(GeoNodeConfigConverter.get_overlays(viewer_obj)[0], overlays)
+
+    def test_backgrounds(self):
+        from mapstore2_adapter.settings import MAP_BASELAYERS, MAP_BASELAYERS_INDEX
+
+        baselayers = copy.deepcopy(MAP_BASELAYERS)
+        self.assertEqual(MAP_BASELAYERS_INDEX['mapnik'], 1)
+        self.assertNotIn(None, MAP_BASELAYERS_INDEX)
+
+        viewer_obj = to_json(GEONODE_SAMPLE_GXP_CONFIG)
+        viewer_obj['map']['layers'][-2]['opacity'] = 0.7
+        backgrounds = GeoNodeConfigConverter.getBackgrounds(viewer_obj, MAP_BASELAYERS)
+        self.assertEqual(len(backgrounds), len(MAP_BASELAYERS))
+        self.assertEqual([_b['name'] for _b in backgrounds if _b['visibility']], ['mapnik'])
+        self.assertEqual(backgrounds[1]['opacity'], 0.7)
+
+        # The settings are left untouched
+        self.assertEqual(MAP_BASELAYERS, baselayers)
+
+        viewer_obj['map']['layers'][-2]['visibility'] = False
+        backgrounds = GeoNodeConfigConverter.getBackgrounds(viewer_obj, MAP_BASELAYERS)
+        self.assertFalse(any(_b['visibility'] for _b in backgrounds))
+
+    def test_overlay_fields_mapping(self):
+
+        class CustomConfigConverter(GeoNodeMapStore2ConfigConverter):
+            OVERLAY_FIELDS = GeoNodeMapStore2ConfigConverter.OVERLAY_FIELDS + (
+                ('tiled', 'tiled', MISSING, None),
+                ('displayInLayerSwitcher', 'hidden', MISSING, lambda _v: not _v),
+            )
+
+        viewer_obj = to_json(GEONODE_SAMPLE_GXP_CONFIG)
+        layer = viewer_obj['map']['layers'][-1]
+        source = viewer_obj['sources'][layer['source']]
+        projection = viewer_obj['map']['projection']
+
+        overlay = GeoNodeConfigConverter.convert_overlay(layer, source, projection)
+        self.assertEqual(overlay['format'], 'image/png')
+        self.assertFalse(overlay['hidden'])
+        self.assertNotIn('tiled', overlay)
+
+        layer.update({'tiled': True, 'displayInLayerSwitcher': False})
+        custom_overlay = CustomConfigConverter().get_overlay(layer, source, projection)
+        self.assertTrue(custom_overlay['tiled'])
+        self.assertTrue(custom_overlay['hidden'])
+        self.assertNotIn('tiled', GeoNodeConfigConverter.get_overlay(layer, source, projection))
+
+    def test_feature_info_template(self):
+        feature_info_cache.cache_clear()
+        template = get_feature_info_template(['name', 'pop'], {'name': 'Name', 'pop': ''})
+        self.assertEqual(
+            template,
+            '<div>'
+            '<div class="row"><div class="col-xs-4" style="font-weight: bold; word-wrap: break-word;">Name</div> '
+            '                                        '
+            '<div class="col-xs-8" style="word-wrap: break-word;">${properties.name}</div></div>'
+            '<div class="row"><div class="col-xs-4" style="font-weight: bold; word-wrap: break-word;">pop</div> '
+            '                                        '
+            '<div class="col-xs-8" style="word-wrap: break-word;">${properties.pop}</div></div>'
+            '</div>')
+        self.assertEqual(get_feature_info_template([], {}), '<div></div>')
+
+        self.assertEqual(get_feature_info_template(['name', 'pop'], {'name': 'Name', 'pop': None}), template)
+        self.assertEqual(feature_info_cache.cache_info().hits, 1)
+
+    def test_overlays_center_and_zoom(self):
+        viewer_obj = to_json(GEONODE_SAMPLE_GXP_CONFIG)
+        overlays, selected = GeoNodeConfigConverter.get_overlays(viewer_obj)
+        center, zoom = GeoNodeConfigConverter.get_center_and_zoom(viewer_obj['map'], selected)
+
+        GeoNodeConfigConverter.set_overlays_center_and_zoom(viewer_obj['map'], overlays)
+        self.assertEqual(selected['center'], center)
+        self.assertEqual(selected['zoom'], zoom)
+        self.assertEqual(selected['zoom'], 9)
+
+    def test_batch_centers_and_zooms(self):
+        view_map = to_json(GEONODE_SAMPLE_GXP_CONFIG)['map']
+        bboxes = [
+            [-10004494.3987, 1589190.41896, -9875320.66639, 1700550.58423],
+            [-89.871902282, 14.130479802, -88.711514902, 15.098465755],
+            [419999.9975, 4248999.9967, 500000.0, 4416000.0],
+            [-180, -90, 180, 90],
+            [0, 0, 1, 1],
+        ]
+        crs = ['EPSG:900913', 'EPSG:4326', 'EPSG:26918', 'EPSG:4326', 'unknown']
+
+        results = GeoNodeConfigConverter.get_centers_and_zooms(view_map, bboxes, crs)
+        with mock.patch('mapstore2_adapter.plugins.geonode.get_numpy', return_value=None):
+            self.assertEqual(GeoNodeConfigConverter.get_centers_and_zooms(view_map, bboxes, crs), results)
+
+        self.assertEqual([zoom for center, zoom in results], [9, 9, 8, 0, view_map['zoom']])
+        self.assertAlmostEqual(results[1][0]['x'], -89.291708592)
+        self.assertAlmostEqual(results[1][0]['y'], 14.6144727785)
+        self.assertEqual(results[1][0]['crs'], 'EPSG:4326')
+        self.assertEqual(results[3][0], (0, 0))
+
+    @override_settings(MAPSTORE2_ADAPTER_CONVERT_CACHE='default')
+    def test_ms2_config_convert_cache(self):
+        caches['default'].clear()
+        resource = MapStoreResource.objects.create(id=1234, user=self.foo_user, name='map_test')
+        viewer_obj = to_json(GEONODE_SAMPLE_GXP_CONFIG)
+        viewer_obj['id'] = resource.id
+
+        with mock.patch.object(GeoNodeConfigConverter, 'get_config',
+                               wraps=GeoNodeConfigConverter.get_config) as get_config:
+            ms2_config = GeoNodeConfigConverter.convert(viewer_obj, None)
+            self.assertEqual(GeoNodeConfigConverter.convert(viewer_obj, None), ms2_config)
+            self.assertEqual(get_config.call_count, 1)
+
+            # Explicit invalidation
+            invalidate_converted_config(resource.id)
+            self.assertEqual(GeoNodeConfigConverter.convert(viewer_obj, None), ms2_config)
+            self.assertEqual(get_config.call_count, 2)
+
+            # Saving the resource bumps its last_update
+            resource.save()
+            self.assertEqual(GeoNodeConfigConverter.convert(viewer_obj, None), ms2_config)
+            self.assertEqual(get_config.call_count, 3)
+
+            # A different viewer is converted again
+            viewer_obj['about']['title'] = 'map_test'
+            GeoNodeConfigConverter.convert(viewer_obj, None)
+            self.assertEqual(get_config.call_count, 4)
+
     def test_gxp_config_convert(self):
         ms2_config = GeoNodeConfigConverter.convert(GEONODE_SAMPLE_GXP_CONFIG, None)
         gxp_config = GeoNodeConfigConverter.viewer_json(ms2_config, None)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#########################################################################
+#
+# Copyright 2018, GeoSolutions Sas.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+#
+#########################################################################
+
+from __future__ import unicode_literals
+
+import datetime
+import decimal
+import importlib
+import json
+import logging
+import uuid
+
+from collections import OrderedDict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, override_settings
+from django.utils.functional import lazy
+from django.utils.six import text_type
+
+from mapstore2_adapter import json_backend
+from mapstore2_adapter.plugins.geonode import GeoNodeMapStore2ConfigConverter
+
+from .test_converters import GEONODE_SAMPLE_GXP_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+GeoNodeConfigConverter = GeoNodeMapStore2ConfigConverter()
+
+
+def get_installed_backends():
+    backends = ['json']
+    for _name, _backend in json_backend.BACKENDS:
+        try:
+            importlib.import_module(_name)
+            backends.append(_name)
+        except ImportError:
+            pass
+    return backends
+
+
+SAMPLE = OrderedDict((
+    ('zoom', 3),
+    ('name', 'Mappa di prova àèì'),
+    ('url', 'http://localhost:8080/geoserver/wms'),
+    ('bbox', [-180.0, -90.0, 180.0, 90.5]),
+    ('created', datetime.datetime(2019, 6, 18, 12, 36, 5, 123456)),
+    ('day', datetime.date(2019, 6, 18)),
+    ('opacity', decimal.Decimal('0.75')),
+    ('uuid', uuid.UUID('a8098c1a-f86e-11da-bd1a-00112444be1e')),
+    ('label', lazy(lambda: 'Layer', text_type)()),
+    ('nested', {'b': None, 'a': True, 'c': {'z': 1, 'y': [1, 2]}}),
+))
+
+
+class TestJSONBackend(TestCase):
+
+    def test_parity(self):
+        expected = json.loads(json.dumps(SAMPLE, cls=DjangoJSONEncoder))
+        for _name in get_installed_backends():
+            with override_settings(MAPSTORE2_ADAPTER_JSON_BACKEND=_name):
+                self.assertEqual(json_backend.get_backend().name, _name)
+                encoded = json_backend.dumps(SAMPLE, sort_keys=True)
+                self.assertEqual(json.loads(encoded), expected, _name)
+                self.assertEqual(json_backend.loads(encoded), expected, _name)
+
+                # Deterministic key ordering
+                keys = list(json.loads(encoded, object_pairs_hook=OrderedDict).keys())
+                self.assertEqual(keys, sorted(keys), _name)
+                self.assertEqual(json_backend.dumps(SAMPLE, sort_keys=True), encoded)
+
+                self.assertNotIn(' ', json_backend.dumps([1, {'a': 2}], compact=True))
+
+    def test_convert_parity(self):
+        expected = json.loads(GeoNodeConfigConverter.convert(GEONODE_SAMPLE_GXP_CONFIG, None))
+        for _name in get_installed_backends():
+            with override_settings(MAPSTORE2_ADAPTER_JSON_BACKEND=_name):
+                ms2_config = GeoNodeConfigConverter.convert(GEONODE_SAMPLE_GXP_CONFIG, None)
+                self.assertEqual(json.loads(ms2_config), expected, _name)
+
+    def test_default_backend(self):
+        # Same output as the standard library, whatever is installed
+        self.assertEqual(json_backend.get_backend().name, 'json')
+        self.assertEqual(json_backend.dumps(SAMPLE, sort_keys=True),
+                         json.dumps(SAMPLE, cls=DjangoJSONEncoder, sort_keys=True))
+
+    def test_unknown_backend(self):
+        with override_settings(MAPSTORE2_ADAPTER_JSON_BACKEND='simdjson'):
+            with self.assertRaises(ImproperlyConfigured):
+                json_backend.get_backend()
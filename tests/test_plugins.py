@@ -12,12 +12,22 @@
 
 from __future__ import unicode_literals
 
+import json
 import logging
 import mock
-from geonode.layers.models import Layer
+from geonode.layers.models import Layer, Style
 from geonode.maps.models import Map
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from geonode.tests.base import GeoNodeBaseTestSupport
+from mapstore2_adapter.api.models import (MapStoreAttribute,
+                                          MapStoreResource)
+from mapstore2_adapter.plugins.layers import (LayerContext,
+                                              get_geonode_layer_contexts,
+                                              get_layer_contexts)
+from mapstore2_adapter.plugins.permissions import get_permission_resolver
 from mapstore2_adapter.plugins.serializers import GeoNodeSerializer
 from collections import OrderedDict
 import copy
@@ -346,6 +356,28 @@ REQUEST_DATA = {
 }
 
 
+class InMemoryLayerContexts(object):
+    """In-memory stand-in of GeoNode for get_layer_contexts, recording the lookups."""
+
+    def __init__(self, contexts):
+        self.contexts = contexts
+        self.lookups = []
+
+    def __call__(self, request, names):
+        self.lookups.append(list(names))
+        return dict((_n, self.contexts[_n]) for _n in names if _n in self.contexts)
+
+
+get_test_layer_contexts = InMemoryLayerContexts({
+    'geonode:roads': LayerContext(
+        {'name': 'geonode:roads', 'source': 'local', 'capability': {'name': 'geonode:roads'}},
+        {'ptype': 'gxp_wmscsource', 'url': 'http://localhost:8080/geoserver/ows'}),
+    'remote:rivers': LayerContext(
+        {'name': 'remote:rivers', 'source': 'remote', 'capability': {'name': 'rivers'}},
+        {'ptype': 'gxp_wmscsource', 'remote': True, 'url': 'http://example.com/wms'}),
+})
+
+
 class TestGeoNodeSerializer(GeoNodeBaseTestSupport):
 
     geonode_serializer = GeoNodeSerializer()
@@ -421,3 +453,223 @@ class TestGeoNodeSerializer(GeoNodeBaseTestSupport):
             self.assertEquals(map_layer['opacity'], layer.opacity)
             # Visibility
             self.assertEquals(map_layer['visibility'], layer.visibility)
+
+    @mock.patch("mapstore2_adapter.api.views.MapStoreResourceViewSet")
+    def test_get_queryset_query_count(self, caller):
+        caller.request.user = self.foo_user
+
+        def get_allowed_ids(num_maps):
+            MapStoreResource.objects.all().delete()
+            for i in range(num_maps):
+                _m = Map.objects.create(
+                    owner=self.foo_user, title='map_%s' % i, zoom=0, center_x=0, center_y=0)
+                MapStoreResource.objects.create(id=_m.id, user=self.foo_user, name=_m.title)
+            with CaptureQueriesContext(connection) as ctx:
+                queryset = self.geonode_serializer.get_queryset(caller, MapStoreResource.objects.all())
+                allowed_ids = sorted(queryset.values_list('id', flat=True))
+            return len(ctx.captured_queries), allowed_ids
+
+        queries, _ = get_allowed_ids(2)
+        self.assertEqual(get_allowed_ids(10)[0], queries)
+
+        # The per-row fallback gives the same results
+        _, allowed_ids = get_allowed_ids(3)
+        with override_settings(MAPSTORE2_ADAPTER_ALLOWED_IDS_PROVIDER=None):
+            queryset = self.geonode_serializer.get_queryset(caller, MapStoreResource.objects.all())
+            self.assertEqual(sorted(queryset.values_list('id', flat=True)), allowed_ids)
+
+    @mock.patch("mapstore2_adapter.api.views.MapStoreResourceViewSet")
+    def test_get_queryset_maps_only(self, caller):
+        caller.request.user = self.foo_user
+        _m = Map.objects.create(
+            owner=self.foo_user, title='map_only', zoom=0, center_x=0, center_y=0)
+        _l = Layer.objects.create(name='layer_only', alternate='geonode:layer_only', owner=self.foo_user)
+        MapStoreResource.objects.create(id=_m.id, user=self.foo_user, name=_m.title)
+        # A resource sharing its id with a Layer, not with a Map
+        MapStoreResource.objects.create(id=_l.id, user=self.foo_user, name=_l.name)
+
+        queryset = self.geonode_serializer.get_queryset(caller, MapStoreResource.objects.all())
+        self.assertEqual(list(queryset.values_list('id', flat=True)), [_m.id])
+
+    def test_update_attributes_query_count(self):
+        serializer = mock.MagicMock()
+
+        def update_attributes(resource, num_attributes, value='value'):
+            serializer.instance = resource
+            serializer.validated_data = {}
+            attributes = [
+                {'name': 'attr_%s' % i, 'type': 'string', 'label': 'Attr %s' % i, 'value': '%s_%s' % (value, i)}
+                for i in range(num_attributes)]
+            with CaptureQueriesContext(connection) as ctx:
+                GeoNodeSerializer.update_attributes(serializer, attributes)
+            return len(ctx.captured_queries)
+
+        resource = MapStoreResource.objects.create(user=self.foo_user, name='map_test')
+        other_resource = MapStoreResource.objects.create(user=self.foo_user, name='other_map_test')
+        self.assertEqual(update_attributes(resource, 2), update_attributes(other_resource, 10))
+
+        # Updates of the existing attributes, whatever their number
+        def get_values():
+            return dict(MapStoreAttribute.objects.filter(resource=other_resource).values_list('name', 'value'))
+
+        values = get_values()
+        self.assertEqual(update_attributes(resource, 2, 'updated'),
+                         update_attributes(other_resource, 10, 'updated'))
+        updated_values = get_values()
+        self.assertEqual(sorted(updated_values), sorted(values))
+        self.assertTrue(all(updated_values[_name] != values[_name] for _name in values))
+
+        # Updates and deletions of the existing attributes
+        update_attributes(other_resource, 4)
+        self.assertEqual(
+            sorted(_a.name for _a in serializer.validated_data['attributes']),
+            ['attr_0', 'attr_1', 'attr_2', 'attr_3'])
+        self.assertEqual(MapStoreAttribute.objects.filter(resource=other_resource).count(), 4)
+        self.assertEqual(MapStoreAttribute.objects.filter(resource=resource).count(), 2)
+
+    def test_permission_resolver(self):
+        admin = UserModel.objects.create_superuser("ms_admin", "admin@example.com", "123456")
+        map_obj = Map.objects.create(
+            owner=admin, title='map_perms', zoom=0, center_x=0, center_y=0)
+
+        request = RequestFactory().get('/')
+        request.user = admin
+        resolver = get_permission_resolver(request)
+        self.assertIs(get_permission_resolver(request), resolver)
+        perms = resolver.get_map_perms(map_obj.id)
+        self.assertTrue(perms['change_resourcebase'])
+        self.assertTrue(perms['delete_resourcebase'])
+
+        # Resolved once per request
+        with self.assertNumQueries(0):
+            self.assertEqual(get_permission_resolver(request).get_map_perms(str(map_obj.id)), perms)
+
+        request = RequestFactory().get('/')
+        request.user = self.foo_user
+        perms = get_permission_resolver(request).get_map_perms(map_obj.id)
+        self.assertFalse(perms['change_resourcebase'])
+        self.assertFalse(perms['delete_resourcebase'])
+
+        # Missing resources and requests deny everything
+        self.assertFalse(any(get_permission_resolver(request).get_map_perms(-1).values()))
+        self.assertFalse(any(get_permission_resolver(None).get_map_perms(map_obj.id).values()))
+
+    @override_settings(MAPSTORE2_ADAPTER_LAYER_CONTEXTS_PROVIDER="tests.test_plugins.get_test_layer_contexts")
+    def test_get_layer_contexts(self):
+        get_test_layer_contexts.lookups = []
+        request = RequestFactory().get('/')
+        request.user = self.foo_user
+
+        contexts = get_layer_contexts(['geonode:roads', 'missing', 'geonode:roads', None], request=request)
+        self.assertEqual(list(contexts), ['geonode:roads'])
+        self.assertEqual(contexts['geonode:roads'].layer['source'], 'local')
+        self.assertEqual(get_test_layer_contexts.lookups, [['geonode:roads', 'missing']])
+
+        # Only the names not resolved yet while serving the request are looked up
+        contexts = get_layer_contexts(['remote:rivers', 'missing', 'geonode:roads'], request=request)
+        self.assertEqual(sorted(contexts), ['geonode:roads', 'remote:rivers'])
+        self.assertTrue(contexts['remote:rivers'].source['remote'])
+        self.assertEqual(get_test_layer_contexts.lookups, [['geonode:roads', 'missing'], ['remote:rivers']])
+
+        get_layer_contexts(['geonode:roads'], request=RequestFactory().get('/'))
+        self.assertEqual(len(get_test_layer_contexts.lookups), 3)
+
+    def test_geonode_layer_contexts_query_count(self):
+        admin = UserModel.objects.create_superuser("ms_admin", "admin@example.com", "123456")
+        request = RequestFactory().get('/')
+        request.user = admin
+
+        def get_contexts(num_layers):
+            names = []
+            for i in range(num_layers):
+                _name = 'layer_%s_%s' % (num_layers, i)
+                Layer.objects.create(
+                    name=_name, alternate='geonode:%s' % _name, owner=admin,
+                    bbox_x0=-10, bbox_x1=10, bbox_y0=-5, bbox_y1=5, srid='EPSG:4326')
+                names.append('geonode:%s' % _name)
+            with CaptureQueriesContext(connection) as ctx:
+                contexts = get_geonode_layer_contexts(request, names + ['geonode:missing'])
+            self.assertEqual(sorted(contexts), sorted(names))
+            return len(ctx.captured_queries), contexts
+
+        queries, _ = get_contexts(2)
+        num_queries, contexts = get_contexts(10)
+        self.assertEqual(num_queries, queries)
+
+        context = contexts['geonode:layer_10_0']
+        self.assertEqual(context.layer['source'], 'local')
+        self.assertEqual(context.layer['capability']['name'], 'geonode:layer_10_0')
+        self.assertEqual(context.layer['capability']['bbox']['EPSG:4326']['bbox'], [-10., -5., 10., 5.])
+        self.assertEqual(context.layer['capability']['bbox']['EPSG:4326']['srs'], 'EPSG:4326')
+
+    def test_geonode_layer_capability(self):
+        admin = UserModel.objects.create_superuser("ms_admin", "admin@example.com", "123456")
+        request = RequestFactory().get('/')
+        request.user = admin
+
+        style = Style.objects.create(name='roads_style', sld_title='Roads')
+        layer = Layer.objects.create(
+            name='roads', alternate='geonode:roads', owner=admin, has_time=True,
+            bbox_x0=-10, bbox_x1=10, bbox_y0=-5, bbox_y1=5, srid='EPSG:4326')
+        layer.styles.add(style)
+        layer.keywords.add('transport')
+        Layer.objects.create(
+            name='unknown_srs', alternate='geonode:unknown_srs', owner=admin,
+            bbox_x0=-10, bbox_x1=10, bbox_y0=-5, bbox_y1=5, srid='EPSG:999999')
+
+        contexts = get_geonode_layer_contexts(request, ['geonode:roads', 'geonode:unknown_srs'])
+        capability = contexts['geonode:roads'].layer['capability']
+        self.assertEqual(capability['styles'], [{'name': 'roads_style', 'title': 'Roads'}])
+        self.assertEqual(capability['keywords'], ['transport'])
+        self.assertEqual(capability['prefix'], 'geonode')
+        self.assertEqual(capability['llbbox'], [-10., -5., 10., 5.])
+        self.assertIn('image/png', capability['formats'])
+        self.assertIn('application/json', capability['infoFormats'])
+        self.assertEqual(capability['dimensions']['time']['units'], 'ISO8601')
+
+        # The native EPSG:4326 extent is kept, every bbox is minx, miny, maxx, maxy
+        self.assertEqual(capability['bbox']['EPSG:4326']['bbox'], [-10., -5., 10., 5.])
+        minx, miny, maxx, maxy = capability['bbox']['EPSG:900913']['bbox']
+        self.assertAlmostEqual(minx, -1113194.9079, places=3)
+        self.assertAlmostEqual(maxx, 1113194.9079, places=3)
+        self.assertAlmostEqual(miny, -557305.2572, places=3)
+        self.assertAlmostEqual(maxy, 557305.2572, places=3)
+
+        # Layers whose bbox cannot be reprojected keep the native one only
+        capability = contexts['geonode:unknown_srs'].layer['capability']
+        self.assertEqual(list(capability['bbox']), ['EPSG:999999'])
+        self.assertNotIn('llbbox', capability)
+        self.assertNotIn('dimensions', capability)
+
+    @mock.patch("mapstore2_adapter.api.serializers.MapStoreResourceSerializer",
+                autospec=True)
+    @mock.patch("mapstore2_adapter.api.views.MapStoreResourceViewSet")
+    def test_set_geonode_map_capability(self, caller, serializer):
+        admin = UserModel.objects.create_superuser("ms_admin", "admin@example.com", "123456")
+        serializer.validated_data = OrderedDict([(u'name', u'map_test')])
+        caller.request.user = admin
+
+        request_data = copy.deepcopy(REQUEST_DATA)
+        map_layer = [_l for _l in request_data['data']['map']['layers'] if _l['group'] != u'background'][0]
+        style = Style.objects.create(name='time_style', sld_title='Time')
+        layer = Layer.objects.create(
+            name=map_layer['name'].split(':')[-1], alternate=map_layer['name'], owner=admin, has_time=True,
+            bbox_x0=map_layer['bbox']['bounds']['minx'], bbox_x1=map_layer['bbox']['bounds']['maxx'],
+            bbox_y0=map_layer['bbox']['bounds']['miny'], bbox_y1=map_layer['bbox']['bounds']['maxy'],
+            srid='EPSG:3857')
+        layer.styles.add(style)
+
+        self.geonode_serializer.set_geonode_map(
+            caller=caller,
+            serializer=serializer,
+            map_obj=None,
+            data=request_data["data"],
+            attributes=request_data["attributes"]
+        )
+
+        # The saved map keeps the styles and the time dimension of the layer
+        map_obj = Map.objects.filter(title=REQUEST_DATA['name']).first()
+        saved_layer = [_l for _l in map_obj.layers if _l.name == map_layer['name']][0]
+        capability = json.loads(saved_layer.layer_params)['capability']
+        self.assertEqual([_s['name'] for _s in capability['styles']], ['time_style'])
+        self.assertIn('time', capability['dimensions'])
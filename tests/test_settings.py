@@ -3,10 +3,13 @@ from __future__ import unicode_literals
 import logging
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.conf import settings
+from mapstore2_adapter.apps import run_warm_up
+from mapstore2_adapter.context_processors import resource_urls
 from mapstore2_adapter.settings import (MAP_BASELAYERS,
                                         CATALOGUE_SERVICES)
+from mapstore2_adapter.utils import get_coord_transform, srs_cache, transform_cache
 
 logger = logging.getLogger(__name__)
 
@@ -40,3 +43,26 @@ class TestApplicationSettings(BaseTest):
         local_geonode = CATALOGUE_SERVICES['GeoNode Catalogue']['GeoNode Catalogue']
         self.assertEqual(local_geonode['title'], 'GeoNode Catalogue')
         self.assertEqual(local_geonode['url'], settings.CATALOGUE['default']['URL'])
+
+    def test_resource_urls(self):
+        context = resource_urls(None)
+        self.assertEqual(context['MAP_BASELAYERS'], MAP_BASELAYERS)
+        self.assertEqual(context['CATALOGUE_SERVICES'], CATALOGUE_SERVICES)
+
+        # The settings are read on every call
+        with override_settings(MAPSTORE_DEBUG=True, MAPSTORE_BASELAYERS=[]):
+            context = resource_urls(None)
+            self.assertTrue(context['MAP_DEBUG'])
+            self.assertEqual(context['MAP_BASELAYERS'], [])
+
+    @override_settings(MAPSTORE2_ADAPTER_WARM_UP_SRIDS=(32632, 'EPSG:2154'))
+    def test_warm_up(self):
+        srs_cache.cache_clear()
+        transform_cache.__dict__.clear()
+        run_warm_up()
+        self.assertEqual(srs_cache.cache_info().misses, 2)
+
+        # The transforms are built from the spatial references already loaded
+        get_coord_transform(32632, 2154)
+        self.assertEqual(srs_cache.cache_info().misses, 2)
+        self.assertEqual(srs_cache.cache_info().hits, 2)
@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import logging
+import threading
 
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import Polygon
@@ -9,7 +10,14 @@ from django.test import TestCase
 
 from mapstore2_adapter import DjangoMapstore2AdapterBaseException
 from mapstore2_adapter.utils import (GoogleZoom,
-                                     get_valid_number)
+                                     LRUCache,
+                                     get_coord_transform,
+                                     get_spatial_reference,
+                                     get_valid_number,
+                                     reproject_bbox,
+                                     srs_cache,
+                                     transform_cache,
+                                     transform_bbox)
 
 
 logger = logging.getLogger(__name__)
@@ -30,6 +38,12 @@ class BaseTest(TestCase):
 
 class TestAdapterUtils(BaseTest):
 
+    def setUp(self):
+        super(TestAdapterUtils, self).setUp()
+        # Start every test with cold spatial reference and transform caches
+        srs_cache.cache_clear()
+        transform_cache.__dict__.clear()
+
     def test_get_valid_numbers(self):
         self.assertEqual(get_valid_number(1.2), 1.2)
         self.assertEqual(get_valid_number('1.2'), 1.2)
@@ -93,3 +107,112 @@ class TestAdapterUtils(BaseTest):
                    get_valid_number(1700550.5842322353), ]
         ov_crs = 'EPSG:900913'
         self.assertEqual(get_zoom(ov_bbox, ov_crs), 8)
+
+    def test_google_extent_zoom(self):
+        google_zoom = GoogleZoom()
+
+        def get_polygon(ov_bbox, ov_crs):
+            srid = int(ov_crs.split(':')[1])
+            srid = 3857 if srid == 900913 else srid
+            poly = Polygon((
+                (ov_bbox[0], ov_bbox[1]),
+                (ov_bbox[0], ov_bbox[3]),
+                (ov_bbox[2], ov_bbox[3]),
+                (ov_bbox[2], ov_bbox[1]),
+                (ov_bbox[0], ov_bbox[1])), srid=srid)
+            poly.transform(CoordTransform(SpatialReference(srid), SpatialReference(4326)))
+            return poly
+
+        # 1. Test Over Max Earth Extent
+        with self.assertRaises(DjangoMapstore2AdapterBaseException):
+            google_zoom.get_extent_zoom(get_polygon([-180, -90, 180, 90], 'EPSG:4326').extent)
+
+        # 2. Test the closed-form zoom against the GEOS reference implementation
+        fixtures = (
+            ([-89.871902282000000, 14.130479802000000, -88.711514902000000, 15.098465755000000], 'EPSG:4326', 8),
+            ([419999.997500000000000, 4248999.996700000000000, 500000.000000000000000, 4416000.000000000000000],
+             'EPSG:26918', 7),
+            ([-1.000449439865508E7, 1589190.418957951, -9875320.66639054, 1700550.5842322353], 'EPSG:900913', 8),
+        )
+        for ov_bbox, ov_crs, zoom in fixtures:
+            poly = get_polygon(ov_bbox, ov_crs)
+            self.assertEqual(google_zoom.get_extent_zoom(poly.extent), zoom)
+            self.assertEqual(google_zoom.get_extent_zoom(poly.extent), google_zoom.get_zoom(poly))
+
+    def test_lru_cache(self):
+        cache = LRUCache(maxsize=2)
+        self.assertEqual(cache.get_or_create('a', lambda: 1), 1)
+        self.assertEqual(cache.get_or_create('a', lambda: 2), 1)
+        cache.get_or_create('b', lambda: 3)
+        cache.get_or_create('c', lambda: 4)
+        # 'a' has been evicted as the least recently used key
+        self.assertEqual(cache.get_or_create('a', lambda: 5), 5)
+        self.assertEqual(cache.cache_info(), (1, 4, 2, 2))
+
+        cache.cache_clear()
+        self.assertEqual(cache.cache_info(), (0, 0, 2, 0))
+
+    def test_lru_cache_factory_unlocked(self):
+        cache = LRUCache(maxsize=2)
+
+        def factory():
+            # Other threads are not blocked while the value is computed
+            thread = threading.Thread(target=cache.get_or_create, args=('b', lambda: 2))
+            thread.start()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+            # Concurrent misses of 'a' keep the first value stored
+            cache.get_or_create('a', lambda: 3)
+            return 1
+
+        self.assertEqual(cache.get_or_create('a', factory), 3)
+        self.assertEqual(cache.get_or_create('b', lambda: 4), 2)
+
+    def test_srs_cache(self):
+        trans = get_coord_transform('EPSG:900913', 4326)
+        self.assertIs(get_coord_transform(3857, 'EPSG:4326'), trans)
+        self.assertIs(get_spatial_reference('EPSG:3857'), get_spatial_reference(900913))
+        self.assertEqual(get_spatial_reference(4326).srid, 4326)
+
+        # Transforms are kept per thread, spatial references are shared
+        info = srs_cache.cache_info()
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.currsize, 2)
+        self.assertEqual(info.hits, 3)
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_coord_transform(3857, 4326)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], trans)
+        self.assertEqual(srs_cache.cache_info().misses, 2)
+
+    def test_bounds_zoom(self):
+        google_zoom = GoogleZoom()
+        bounds = [-89.871902282, 14.130479802, -88.711514902, 15.098465755]
+        self.assertEqual(google_zoom.get_bounds_zoom(bounds), 8)
+        with self.assertRaises(TypeError):
+            google_zoom.get_bounds_zoom([-10004494.3987, 1589190.41896, -9875320.66639, 1700550.58423], srid=3857)
+
+    def test_reproject_bbox(self):
+        mercator_bbox = [-10004494.3987, 1589190.41896, -9875320.66639, 1700550.58423]
+        wgs84_bbox = [-89.871902282, 14.130479802, -88.711514902, 15.098465755]
+
+        for srid in ('EPSG:3857', 'EPSG:900913', 3857):
+            extent = reproject_bbox(mercator_bbox, srid, 4326)
+            for value, expected in zip(extent, transform_bbox(mercator_bbox, 3857, 4326)):
+                self.assertAlmostEqual(value, expected, places=9)
+            for value, expected in zip(extent, wgs84_bbox):
+                self.assertAlmostEqual(value, expected, places=6)
+
+        extent = reproject_bbox(wgs84_bbox, 'EPSG:4326', 'EPSG:3857')
+        for value, expected in zip(extent, transform_bbox(wgs84_bbox, 4326, 3857)):
+            self.assertAlmostEqual(value, expected, places=3)
+
+        # Same SRID, the bbox is just normalized
+        self.assertEqual(reproject_bbox([10, 20, 0, 5], 'EPSG:4326', 4326), (0, 5, 10, 20))
+
+        # Other SRIDs go through GDAL
+        utm_bbox = [419999.9975, 4248999.9967, 500000.0, 4416000.0]
+        self.assertEqual(reproject_bbox(utm_bbox, 'EPSG:26918', 4326),
+                         transform_bbox(utm_bbox, 26918, 4326))